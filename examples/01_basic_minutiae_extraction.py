@@ -8,7 +8,8 @@ using both the functional and object-oriented interfaces.
 """
 
 import numpy as np
-from pynbis import extract_minutiae, Fingerprint
+from pynbis import extract_minutiae, Fingerprint, MinutiaType
+from pynbis.testing import sample_fingerprint
 
 def main():
     # Generate a sample fingerprint image (replace with real data)
@@ -20,7 +21,7 @@ def main():
     print("=" * 50)
     
     # Create a sample image (normally you'd load a real fingerprint)
-    image = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
+    image = sample_fingerprint()
     
     # Method 1: Functional API
     print("\n1. Using Functional API:")
@@ -50,16 +51,17 @@ def main():
     print(f"Total minutiae: {len(fp.minutiae)}")
     print(f"Binarized image available: {fp.binarized_image is not None}")
     
-    # Count minutiae by type
-    endings = sum(1 for m in fp.minutiae if m.minutia_type.name == 'RIDGE_ENDING')
-    bifurcations = sum(1 for m in fp.minutiae if m.minutia_type.name == 'BIFURCATION')
+    # Count minutiae by type (operate on the arrays, not Minutia objects)
+    types = fp.minutiae.types
+    endings = int(np.count_nonzero(types == MinutiaType.RIDGE_ENDING.value))
+    bifurcations = int(np.count_nonzero(types == MinutiaType.BIFURCATION.value))
     
     print(f"\nMinutiae breakdown:")
     print(f"  Ridge endings: {endings}")
     print(f"  Bifurcations: {bifurcations}")
     
     # Find high-quality minutiae
-    high_quality = [m for m in fp.minutiae if m.quality > 0.9]
+    high_quality = np.flatnonzero(fp.minutiae.quals > 0.9)
     print(f"  High quality (>0.9): {len(high_quality)}")
 
 
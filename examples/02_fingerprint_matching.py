@@ -10,47 +10,84 @@ and interpret the matching scores.
 import numpy as np
 from pathlib import Path
 from pynbis import match_fingerprints, Fingerprint
+from pynbis.testing import sample_fingerprint
+from pynbis.utils import load_fingerprint
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
 
 try:
-    from imageio.v2 import imread
     from scipy.ndimage import rotate
-    HAS_IMAGEIO = True
     HAS_SCIPY = True
 except ImportError:
-    HAS_IMAGEIO = False
     HAS_SCIPY = False
 
+# Lower score bounds of each interpretation above "No match"
+SCORE_BINS = np.array([20, 40, 60, 100])
+SCORE_DESCRIPTIONS = (
+    "No match (very low confidence)",
+    "Weak match (low confidence)",
+    "Moderate match (medium confidence)",
+    "Good match (high confidence)",
+    "Excellent match (very high confidence)",
+)
+
+def interpret_scores(scores):
+    """Interpret an array of match scores and return their descriptions."""
+    return [SCORE_DESCRIPTIONS[i]
+            for i in np.searchsorted(SCORE_BINS, scores, side='right').tolist()]
+
 def interpret_score(score):
     """Interpret a match score and return a description."""
-    if score >= 100:
-        return "Excellent match (very high confidence)"
-    elif score >= 60:
-        return "Good match (high confidence)"
-    elif score >= 40:
-        return "Moderate match (medium confidence)"
-    elif score >= 20:
-        return "Weak match (low confidence)"
+    return SCORE_DESCRIPTIONS[int(np.searchsorted(SCORE_BINS, score, side='right'))]
+
+def rotated_gallery(probe, source, angle=10):
+    """
+    Synthesize a gallery image by rotating the probe.
+    
+    The result is cached as ``<source>_rot<angle>.npy`` next to the source
+    image, so only the first run pays for the warp. Returns None if neither
+    OpenCV nor SciPy is installed.
+    """
+    cache = source.with_name(f"{source.stem}_rot{angle}.npy")
+    if cache.exists() and cache.stat().st_mtime >= source.stat().st_mtime:
+        return np.load(cache)
+    
+    if HAS_CV2:
+        h, w = probe.shape
+        matrix = cv2.getRotationMatrix2D(((w - 1) / 2, (h - 1) / 2), angle, 1.0)
+        gallery = cv2.warpAffine(probe, matrix, (w, h), flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+    elif HAS_SCIPY:
+        gallery = rotate(probe, angle=angle, reshape=False, order=1,
+                         mode='constant', cval=255).astype(np.uint8)
     else:
-        return "No match (very low confidence)"
+        return None
+    
+    try:
+        np.save(cache, gallery)
+    except OSError:
+        pass  # read-only data directory; just skip the cache
+    return gallery
 
 def load_sample_images():
     """Load real fingerprint images if available, else generate random."""
     # Try to load from data/fingerprints first (high quality)
     fingerprints_dir = Path(__file__).parent.parent / "data" / "fingerprints"
     
-    if HAS_IMAGEIO and fingerprints_dir.exists():
+    if fingerprints_dir.exists():
         image_files = list(fingerprints_dir.glob("*.jpg")) + list(fingerprints_dir.glob("*.png"))
         if len(image_files) >= 1:
             try:
                 # Load one image
-                probe = imread(image_files[0]).astype(np.uint8)
-                # Ensure grayscale
-                if probe.ndim == 3:
-                    probe = probe[:, :, 0]
+                probe = load_fingerprint(image_files[0])
                 
                 # Create rotated version as gallery (10 degrees)
-                if HAS_SCIPY:
-                    gallery = rotate(probe, angle=10, reshape=False, order=1, mode='constant', cval=255).astype(np.uint8)
+                gallery = rotated_gallery(probe, image_files[0])
+                if gallery is not None:
                     print(f"Loaded real fingerprint from {fingerprints_dir.name}")
                     print(f"  Image: {image_files[0].name}")
                     print(f"  Gallery: Same image rotated 10°\n")
@@ -59,7 +96,7 @@ def load_sample_images():
                     gallery = probe.copy()
                     print(f"Loaded real fingerprint from {fingerprints_dir.name}")
                     print(f"  Image: {image_files[0].name}")
-                    print(f"  Note: Install scipy for rotation test\n")
+                    print(f"  Note: Install opencv-python or scipy for rotation test\n")
                 
                 return probe, gallery, True
             except Exception:
@@ -67,16 +104,14 @@ def load_sample_images():
     
     # Fallback to SOCOFing dataset
     socofing_dir = Path(__file__).parent.parent / "data" / "socofing"
-    if HAS_IMAGEIO and socofing_dir.exists():
+    if socofing_dir.exists():
         image_files = sorted(socofing_dir.glob("**/*.BMP"))
         if len(image_files) >= 1:
             try:
-                probe = imread(image_files[0]).astype(np.uint8)
-                if probe.ndim == 3:
-                    probe = probe[:, :, 0]
+                probe = load_fingerprint(image_files[0])
                 
-                if HAS_SCIPY:
-                    gallery = rotate(probe, angle=10, reshape=False, order=1, mode='constant', cval=255).astype(np.uint8)
+                gallery = rotated_gallery(probe, image_files[0])
+                if gallery is not None:
                     print(f"Loaded fingerprint from SOCOFing dataset")
                     print(f"  Image: {image_files[0].name}")
                     print(f"  Gallery: Same image rotated 10°\n")
@@ -90,9 +125,10 @@ def load_sample_images():
                 pass
     
     # Fallback to random images
-    print("Using random images (install 'imageio' and run 'python scripts/download_socofing.py' for real data)")
-    probe = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
-    gallery = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
+    print("Using random images (install 'opencv-python' or 'Pillow' and run "
+          "'python scripts/download_socofing.py' for real data)")
+    probe = sample_fingerprint(seed=0)
+    gallery = sample_fingerprint(seed=1)
     return probe, gallery, False
 
 
@@ -186,11 +222,13 @@ def main():
     result_v = fp_latent_v.match(fp_full, threshold=20)
     result_h = fp_latent_h.match(fp_full, threshold=20)
     
+    desc_v, desc_h = interpret_scores([result_v.score, result_h.score])
+    
     print(f"\nLatent matching results:")
     print(f"  Vertical half vs Full: Score={result_v.score}, Matched={result_v.matched}")
-    print(f"    {interpret_score(result_v.score)}")
+    print(f"    {desc_v}")
     print(f"  Horizontal half vs Full: Score={result_h.score}, Matched={result_h.matched}")
-    print(f"    {interpret_score(result_h.score)}")
+    print(f"    {desc_h}")
 
     # Scenario C: Self-match (same image for probe and gallery)
     print("\n5. Self-Match Sanity Check (identical images):")
@@ -10,12 +10,8 @@ NFIQ (NIST Fingerprint Image Quality) scores.
 import numpy as np
 from pathlib import Path
 from pynbis import compute_quality, Fingerprint
-
-try:
-    from imageio.v2 import imread
-    HAS_IMAGEIO = True
-except ImportError:
-    HAS_IMAGEIO = False
+from pynbis.testing import sample_fingerprint
+from pynbis.utils import load_fingerprint
 
 def interpret_nfiq(quality_value):
     """Interpret NFIQ score and return detailed information."""
@@ -36,20 +32,18 @@ def load_sample_image():
     """Load a real fingerprint image if available, else generate random."""
     fingerprints_dir = Path(__file__).parent.parent / "data" / "fingerprints"
     
-    if HAS_IMAGEIO and fingerprints_dir.exists():
+    if fingerprints_dir.exists():
         image_files = list(fingerprints_dir.glob("*.jpg")) + list(fingerprints_dir.glob("*.png"))
         if len(image_files) >= 1:
             try:
-                image = imread(image_files[0]).astype(np.uint8)
-                if image.ndim == 3:
-                    image = image[:, :, 0]
+                image = load_fingerprint(image_files[0])
                 print(f"Loaded real fingerprint: {image_files[0].name}\n")
                 return image, True
             except Exception:
                 pass
     
     print("Using random image (no real fingerprint found)\n")
-    return np.random.randint(0, 256, (480, 640), dtype=np.uint8), False
+    return sample_fingerprint(), False
 
 def main():
     print("PyNBIS Example 3: Quality Assessment (NFIQ)")
@@ -70,9 +64,9 @@ def main():
     else:
         # Generate sample fingerprint images with different characteristics
         images = {
-            "Sample 1": np.random.randint(0, 256, (480, 640), dtype=np.uint8),
-            "Sample 2": np.random.randint(50, 200, (480, 640), dtype=np.uint8),
-            "Sample 3": np.random.randint(100, 150, (480, 640), dtype=np.uint8),
+            "Sample 1": sample_fingerprint(seed=1),
+            "Sample 2": sample_fingerprint(seed=2, low=50, high=200),
+            "Sample 3": sample_fingerprint(seed=3, low=100, high=150),
         }
     
     # Method 1: Functional API
@@ -94,20 +88,17 @@ def main():
     print("\n2. Using Object-Oriented API:")
     print("-" * 50)
     
-    fingerprints = []
-    for name, image in images.items():
-        fp = Fingerprint(image, ppi=500)
-        fp.compute_quality()
-        fingerprints.append((name, fp))
+    names = list(images)
+    fingerprints = [Fingerprint(images[name], ppi=500) for name in names]
+    quals = np.array([fp.compute_quality().quality for fp in fingerprints], dtype=np.uint8)
     
-    # Sort by quality (best first)
-    fingerprints.sort(key=lambda x: x[1].quality.quality)
+    # Rank by quality (best first); the stable sort keeps input order on ties
+    order = np.argsort(quals, kind='stable')
     
     print("\nFingerprints ranked by quality (best to worst):")
-    for rank, (name, fp) in enumerate(fingerprints, 1):
-        quality = fp.quality
-        desc, _, _ = interpret_nfiq(quality.quality)
-        print(f"  {rank}. {name}: {quality.quality}/5 ({desc})")
+    for rank, i in enumerate(order.tolist(), 1):
+        desc, _, _ = interpret_nfiq(int(quals[i]))
+        print(f"  {rank}. {names[i]}: {quals[i]}/5 ({desc})")
     
     # Quality-based filtering
     print("\n3. Quality-Based Filtering:")
@@ -117,25 +108,19 @@ def main():
     
     print(f"Filtering with minimum quality threshold: {min_quality}")
     
-    for name, fp in fingerprints:
-        if fp.quality.quality <= min_quality:
-            status = "✓ ACCEPTED"
-        else:
-            status = "✗ REJECTED"
-        print(f"  {name}: Quality {fp.quality.quality}/5 -> {status}")
+    accepted = quals[order] <= min_quality
+    for i, ok in zip(order.tolist(), accepted.tolist()):
+        status = "✓ ACCEPTED" if ok else "✗ REJECTED"
+        print(f"  {names[i]}: Quality {quals[i]}/5 -> {status}")
     
     # Combined quality and minutiae analysis
     print("\n4. Combined Quality and Minutiae Analysis:")
     print("-" * 50)
     
     for name, image in list(images.items())[:1]:  # Just first sample
-        fp = Fingerprint(image, ppi=500)
-        
-        # Get quality
-        quality = fp.compute_quality()
-        
-        # Extract minutiae
-        minutiae = fp.extract_minutiae()
+        # Quality and minutiae from a single detection pass
+        fp = Fingerprint(image, ppi=500).analyze()
+        quality, minutiae = fp.quality, fp.minutiae
         
         # Analyze
         print(f"\n{name} - Detailed Analysis:")
@@ -8,66 +8,94 @@ against a gallery of multiple fingerprints for identification.
 """
 
 import numpy as np
-from pynbis import Fingerprint
+from pathlib import Path
+from pynbis import Fingerprint, GalleryStore, iter_scores
+from pynbis.testing import sample_fingerprint
+
+# Gallery images and enrolled templates, reused across runs
+GALLERY_DIR = Path(__file__).parent.parent / "data" / "gallery"
+
+# Lower score bounds of each class above the lowest; shared by the
+# confidence labels and the score distribution
+SCORE_BINS = np.array([20, 40, 60, 100])
+CONFIDENCE_LABELS = ("Very Low", "Low", "Medium", "High", "Very High")
+RANGE_LABELS = ("No match (0-19)", "Weak (20-39)", "Moderate (40-59)",
+                "Good (60-99)", "Excellent (100+)")
+
+
+def load_gallery(size: int) -> GalleryStore:
+    """Open the on-disk gallery, creating and enrolling it on first run."""
+    try:
+        store = GalleryStore.open(GALLERY_DIR)
+        if len(store) == size and store.enrolled:
+            print(f"Loading {size} gallery templates from {GALLERY_DIR}...")
+            return store
+    except FileNotFoundError:
+        pass
+    
+    print(f"Creating gallery of {size} fingerprints...")
+    store = GalleryStore.create(
+        GALLERY_DIR, [sample_fingerprint(seed=i + 1) for i in range(size)], ppi=500
+    )
+    
+    # Extraction releases the GIL, so enrollment uses a thread pool; the
+    # templates are saved so later runs skip extraction entirely
+    return store.enroll()
+
 
 def main():
     print("PyNBIS Example 4: 1:N Identification")
     print("=" * 50)
     
     # Create probe fingerprint
-    probe_image = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
+    probe_image = sample_fingerprint(seed=0)
     probe = Fingerprint(probe_image, ppi=500)
     probe.extract_minutiae()
     
     print(f"Probe fingerprint: {len(probe.minutiae)} minutiae")
     
-    # Create gallery of fingerprints
-    print("\nCreating gallery of 10 fingerprints...")
-    gallery = []
-    for i in range(10):
-        gallery_image = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
-        fp = Fingerprint(gallery_image, ppi=500)
-        fp.extract_minutiae()
-        gallery.append(fp)
+    # Load or enroll the gallery; records are read from disk on demand
+    print()
+    gallery = load_gallery(10)
+    
+    for i, fp in enumerate(gallery):
         print(f"  Gallery #{i+1}: {len(fp.minutiae)} minutiae")
     
     # Perform 1:N matching
     print("\nMatching probe against gallery...")
     print("-" * 50)
     
-    results = []
-    for i, gallery_fp in enumerate(gallery):
-        match_result = probe.match(gallery_fp)
-        results.append((i + 1, match_result.score))
+    # Stream the gallery through the matcher: only one chunk of fingerprints
+    # is loaded at a time, and just the integer scores are kept. (When only
+    # the best candidates are needed, iter_match keeps a top-k heap instead.)
+    scores = np.fromiter((score for _, score in iter_scores(probe, gallery)),
+                         dtype=np.int32, count=len(gallery))
     
-    # Sort by score (highest first)
-    results.sort(key=lambda x: x[1], reverse=True)
+    # Select the top 5 with a linear-time partition, then order just those
+    # (highest score first, lower gallery index first on ties)
+    k = min(5, len(scores))
+    top = np.argpartition(scores, -k)[-k:]
+    top = top[np.lexsort((top, -scores[top]))]
     
     # Display results
     print("\nTop 5 matches:")
     print(f"{'Rank':<6} {'Gallery ID':<12} {'Score':<8} {'Confidence'}")
     print("-" * 50)
     
-    for rank, (gallery_id, score) in enumerate(results[:5], 1):
-        if score >= 100:
-            confidence = "Very High"
-        elif score >= 60:
-            confidence = "High"
-        elif score >= 40:
-            confidence = "Medium"
-        elif score >= 20:
-            confidence = "Low"
-        else:
-            confidence = "Very Low"
+    # Classify every score once; labels and the distribution index into it
+    score_class = np.searchsorted(SCORE_BINS, scores, side='right')
+    
+    for rank, index in enumerate(top.tolist(), 1):
+        confidence = CONFIDENCE_LABELS[score_class[index]]
         
-        print(f"{rank:<6} Gallery #{gallery_id:<5} {score:<8} {confidence}")
+        print(f"{rank:<6} Gallery #{index + 1:<5} {scores[index]:<8} {confidence}")
     
     # Identification decision
     print("\nIdentification Decision:")
     print("-" * 50)
     
     threshold = 60  # Identification threshold
-    best_match_id, best_score = results[0]
+    best_match_id, best_score = int(top[0]) + 1, int(scores[top[0]])
     
     if best_score >= threshold:
         print(f"✓ IDENTIFIED: Gallery #{best_match_id} (score: {best_score})")
@@ -78,16 +106,9 @@ def main():
     print("\nScore Distribution:")
     print("-" * 50)
     
-    score_ranges = [
-        (100, float('inf'), "Excellent (100+)"),
-        (60, 100, "Good (60-99)"),
-        (40, 60, "Moderate (40-59)"),
-        (20, 40, "Weak (20-39)"),
-        (0, 20, "No match (0-19)"),
-    ]
+    counts = np.bincount(score_class, minlength=len(RANGE_LABELS))
     
-    for min_score, max_score, label in score_ranges:
-        count = sum(1 for _, score in results if min_score <= score < max_score)
+    for label, count in zip(reversed(RANGE_LABELS), counts[::-1].tolist()):
         bar = "█" * count
         print(f"{label:<20} {count:2d} {bar}")
 
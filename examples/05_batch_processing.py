@@ -8,11 +8,17 @@ in batch mode, extracting minutiae and computing quality scores.
 """
 
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pynbis import Fingerprint
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def process_fingerprint(image: np.ndarray, ppi: int = 500) -> Dict:
     """Process a single fingerprint and return results."""
     fp = Fingerprint(image, ppi=ppi)
@@ -28,31 +34,40 @@ def process_fingerprint(image: np.ndarray, ppi: int = 500) -> Dict:
         'minutiae_count': len(fp.minutiae),
         'quality_score': fp.quality.quality,
         'quality_confidence': fp.quality.confidence,
-        'minutiae': [
-            {
-                'x': m.x,
-                'y': m.y,
-                'direction': m.direction,
-                'type': m.minutia_type.name,
-                'quality': m.quality,
-            }
-            for m in fp.minutiae
-        ]
+        # Minutiae as columns (NumPy arrays), serialized without per-minutia
+        # Python objects; 'type' holds MinutiaType values
+        'minutiae': {
+            'x': fp.minutiae.xs,
+            'y': fp.minutiae.ys,
+            'direction': fp.minutiae.dirs,
+            'type': fp.minutiae.types,
+            'quality': fp.minutiae.quals,
+        }
     }
     
     return results
 
+def try_process(item: Tuple[str, np.ndarray]) -> Tuple[str, Dict]:
+    """Process one (id, image) pair, capturing any error in the result."""
+    fp_id, image = item
+    try:
+        return fp_id, process_fingerprint(image)
+    except Exception as e:
+        return fp_id, {'error': str(e)}
+
 def main():
     print("PyNBIS Example 5: Batch Processing")
     print("=" * 50)
     
     # Simulate a batch of fingerprints
     print("\nGenerating 20 sample fingerprints...")
-    fingerprints = []
-    for i in range(20):
-        # In practice, you would load real images
-        image = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
-        fingerprints.append((f"FP_{i+1:03d}", image))
+    # The whole batch lives in one (N, H, W) buffer and each print is a view
+    # into it, instead of N separate image allocations. In practice, you
+    # would decode real images into such a buffer (or open a GalleryStore,
+    # whose images are one memory-mapped array).
+    rng = np.random.default_rng()
+    batch = rng.integers(0, 256, size=(20, 480, 640), dtype=np.uint8)
+    fingerprints = [(f"FP_{i+1:03d}", image) for i, image in enumerate(batch)]
     
     # Process all fingerprints
     print("\nProcessing fingerprints...")
@@ -60,66 +75,68 @@ def main():
     
     all_results = {}
     
-    for fp_id, image in fingerprints:
-        try:
-            results = process_fingerprint(image)
+    # Minutiae detection releases the GIL, so threads process fingerprints in
+    # parallel without pickling images to worker processes. map() yields
+    # results in submission order.
+    with ThreadPoolExecutor() as executor:
+        for fp_id, results in executor.map(try_process, fingerprints):
             all_results[fp_id] = results
             
             # Print progress
-            quality = results['quality_score']
-            minutiae = results['minutiae_count']
-            print(f"✓ {fp_id}: Quality={quality}/5, Minutiae={minutiae}")
-            
-        except Exception as e:
-            print(f"✗ {fp_id}: Error - {str(e)}")
-            all_results[fp_id] = {'error': str(e)}
+            if 'error' in results:
+                print(f"✗ {fp_id}: Error - {results['error']}")
+            else:
+                quality = results['quality_score']
+                minutiae = results['minutiae_count']
+                print(f"✓ {fp_id}: Quality={quality}/5, Minutiae={minutiae}")
     
     # Statistics
     print("\nBatch Statistics:")
     print("-" * 50)
     
-    successful = [r for r in all_results.values() if 'error' not in r]
+    ids = [fp_id for fp_id, r in all_results.items() if 'error' not in r]
+    successful = [all_results[fp_id] for fp_id in ids]
     
     if successful:
-        qualities = [r['quality_score'] for r in successful]
-        minutiae_counts = [r['minutiae_count'] for r in successful]
+        qualities = np.fromiter((r['quality_score'] for r in successful),
+                                dtype=np.int8, count=len(successful))
+        minutiae_counts = np.fromiter((r['minutiae_count'] for r in successful),
+                                      dtype=np.int32, count=len(successful))
         
         print(f"Total processed: {len(all_results)}")
         print(f"Successful: {len(successful)}")
         print(f"Failed: {len(all_results) - len(successful)}")
         
         print(f"\nQuality Distribution:")
+        quality_counts = np.bincount(qualities, minlength=6)
         for q in range(1, 6):
-            count = qualities.count(q)
+            count = quality_counts[q]
             percentage = (count / len(qualities)) * 100
             bar = "█" * int(percentage / 5)
             print(f"  Quality {q}: {count:2d} ({percentage:5.1f}%) {bar}")
         
         print(f"\nMinutiae Statistics:")
-        print(f"  Average: {sum(minutiae_counts) / len(minutiae_counts):.1f}")
-        print(f"  Minimum: {min(minutiae_counts)}")
-        print(f"  Maximum: {max(minutiae_counts)}")
+        print(f"  Average: {minutiae_counts.mean():.1f}")
+        print(f"  Minimum: {minutiae_counts.min()}")
+        print(f"  Maximum: {minutiae_counts.max()}")
+        
+        high_quality = qualities <= 3
+        sufficient_minutiae = minutiae_counts >= 25
+        good_prints = [fp_id for fp_id, good
+                       in zip(ids, high_quality & sufficient_minutiae) if good]
         
         # Quality-based filtering
         print(f"\nQuality Filtering (threshold <= 3):")
-        high_quality = [fp_id for fp_id, r in all_results.items() 
-                        if 'error' not in r and r['quality_score'] <= 3]
-        print(f"  High quality prints: {len(high_quality)}/{len(successful)}")
-        print(f"  Percentage: {(len(high_quality)/len(successful))*100:.1f}%")
+        print(f"  High quality prints: {high_quality.sum()}/{len(successful)}")
+        print(f"  Percentage: {high_quality.mean()*100:.1f}%")
         
         # Minutiae-based filtering
         print(f"\nMinutiae Filtering (threshold >= 25):")
-        sufficient_minutiae = [fp_id for fp_id, r in all_results.items()
-                              if 'error' not in r and r['minutiae_count'] >= 25]
-        print(f"  Sufficient minutiae: {len(sufficient_minutiae)}/{len(successful)}")
-        print(f"  Percentage: {(len(sufficient_minutiae)/len(successful))*100:.1f}%")
+        print(f"  Sufficient minutiae: {sufficient_minutiae.sum()}/{len(successful)}")
+        print(f"  Percentage: {sufficient_minutiae.mean()*100:.1f}%")
         
         # Combined filtering
         print(f"\nCombined Filtering (quality <= 3 AND minutiae >= 25):")
-        good_prints = [fp_id for fp_id, r in all_results.items()
-                      if 'error' not in r 
-                      and r['quality_score'] <= 3 
-                      and r['minutiae_count'] >= 25]
         print(f"  Good quality prints: {len(good_prints)}/{len(successful)}")
         print(f"  IDs: {', '.join(good_prints[:5])}..." if len(good_prints) > 5 
               else f"  IDs: {', '.join(good_prints)}")
@@ -127,19 +144,15 @@ def main():
     # Save results to JSON
     print(f"\nSaving results to batch_results.json...")
     
-    # Convert numpy types to native Python types for JSON serialization
-    json_results = {}
-    for fp_id, result in all_results.items():
-        if 'minutiae' in result:
-            result['minutiae'] = [
-                {k: float(v) if isinstance(v, (np.floating, np.integer)) else v 
-                 for k, v in m.items()}
-                for m in result['minutiae']
-            ]
-        json_results[fp_id] = result
-    
-    with open('batch_results.json', 'w') as f:
-        json.dump(json_results, f, indent=2)
+    # orjson serializes the minutiae arrays natively; the json fallback
+    # converts each array with one tolist() call
+    if orjson is not None:
+        with open('batch_results.json', 'wb') as f:
+            f.write(orjson.dumps(all_results,
+                                 option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2))
+    else:
+        with open('batch_results.json', 'w') as f:
+            json.dump(all_results, f, indent=2, default=lambda a: a.tolist())
     
     print("✓ Results saved successfully")
 
@@ -22,13 +22,17 @@ from .core import (
     match_fingerprints,
     compute_quality,
     match_minutiae,
+    batch_match,
     Fingerprint,
+    MatcherContext,
     MinutiaType,
     Minutia,
+    Minutiae,
     MatchResult,
     QualityResult,
 )
 
+from .gallery import GalleryStore, iter_gallery, iter_match, iter_scores
 from .utils import decode_wsq
 
 __all__ = [
@@ -36,10 +40,17 @@ __all__ = [
     "match_fingerprints",
     "compute_quality",
     "match_minutiae",
+    "batch_match",
     "Fingerprint",
+    "MatcherContext",
     "MinutiaType",
     "Minutia",
+    "Minutiae",
     "MatchResult",
     "QualityResult",
+    "GalleryStore",
+    "iter_gallery",
+    "iter_scores",
+    "iter_match",
     "decode_wsq",
 ]
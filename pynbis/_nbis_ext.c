@@ -23,6 +23,7 @@ or FITNESS FOR A PARTICULAR PURPOSE or for any purpose whatsoever.
 #include <numpy/arrayobject.h>
 #include <string.h>
 #include <stdlib.h>
+#include <limits.h>
 
 /* NBIS Headers */
 #include "bozorth.h"
@@ -30,6 +31,10 @@ or FITNESS FOR A PARTICULAR PURPOSE or for any purpose whatsoever.
 #include "nfiq.h"
 #include "wsq.h"
 
+#ifndef MM_PER_INCH
+#define MM_PER_INCH 25.4
+#endif
+
 /*******************************************************************************
  * Define global variables needed by NBIS libraries
  ******************************************************************************/
@@ -47,61 +52,210 @@ FILE *errorfp = NULL;  /* Error output stream */
 /* WSQ globals */
 int debug = 0;
 
+/* Bozorth3 and the WSQ decoder keep their working tables in globals, and
+ * NFIQ's MLP runs the f2c BLAS, whose sgemv_() keeps its loop counters in
+ * static locals, so calls into each library are serialized by its own lock.
+ * Callers release the GIL before taking a lock and make no Python API calls
+ * while holding it, so other Python threads keep running during a match,
+ * decode or quality computation and the locks can't deadlock against the
+ * GIL. */
+static PyThread_type_lock bozorth_lock = NULL;
+static PyThread_type_lock wsq_lock = NULL;
+static PyThread_type_lock nfiq_lock = NULL;
+
 /*******************************************************************************
  * Helper Functions
  ******************************************************************************/
 
-/* Convert Python bytes/array to image data */
-static unsigned char* py_to_image_data(PyObject *image_obj, int *width, int *height, int *depth) {
-    PyArrayObject *array = NULL;
-    unsigned char *data = NULL;
+/* Get a C-contiguous uint8 view of a 2D image array. No copy is made when
+ * the input already is one; the NBIS routines only read their input image
+ * (MINDTCT pads or copies it internally). Returns a new reference. */
+static PyArrayObject* py_to_image_array(PyObject *image_obj, int *width, int *height, int *depth) {
+    if (!PyArray_Check(image_obj)) {
+        PyErr_SetString(PyExc_TypeError, "Image must be a numpy array");
+        return NULL;
+    }
+    
+    PyArrayObject *array = (PyArrayObject*)PyArray_FROM_OTF(image_obj, NPY_UINT8, NPY_ARRAY_IN_ARRAY);
+    if (!array) {
+        PyErr_SetString(PyExc_ValueError, "Failed to convert image to uint8 array");
+        return NULL;
+    }
+    
+    int ndim = PyArray_NDIM(array);
+    npy_intp *dims = PyArray_DIMS(array);
+    
+    if (ndim == 2 || (ndim == 3 && dims[2] == 1)) {
+        *height = (int)dims[0];
+        *width = (int)dims[1];
+        *depth = 8;
+    } else {
+        PyErr_SetString(PyExc_ValueError, "Image must be 2D grayscale");
+        Py_DECREF(array);
+        return NULL;
+    }
+    
+    return array;
+}
+
+static void free_capsule_buffer(PyObject *capsule) {
+    free(PyCapsule_GetPointer(capsule, NULL));
+}
+
+/* Wrap a malloc'd HxW uint8 buffer in a NumPy array without copying.
+ * The array takes ownership of the buffer; it is freed on failure. */
+static PyObject* adopt_uint8_buffer(unsigned char *data, int height, int width) {
+    npy_intp dims[2] = {height, width};
+    PyObject *array = PyArray_SimpleNewFromData(2, dims, NPY_UINT8, data);
+    if (!array) {
+        free(data);
+        return NULL;
+    }
     
-    if (PyArray_Check(image_obj)) {
-        array = (PyArrayObject*)PyArray_FROM_OTF(image_obj, NPY_UINT8, NPY_ARRAY_IN_ARRAY);
+    PyObject *capsule = PyCapsule_New(data, NULL, free_capsule_buffer);
+    if (!capsule) {
+        Py_DECREF(array);
+        free(data);
+        return NULL;
+    }
+    
+    if (PyArray_SetBaseObject((PyArrayObject*)array, capsule) < 0) {
+        Py_DECREF(array);
+        Py_DECREF(capsule);
+        return NULL;
+    }
+    
+    return array;
+}
+
+/* Convert minutiae to XYT format. Accepts an (N, 3) integer array of
+ * x, y, direction rows (read in place when it is C-contiguous int32) or a
+ * list of dicts with x, y and direction keys. */
+static int py_to_xyt(PyObject *minutiae_obj, struct xyt_struct *xyt) {
+    if (PyArray_Check(minutiae_obj)) {
+        PyArrayObject *array = (PyArrayObject*)PyArray_FROM_OTF(minutiae_obj, NPY_INT32,
+                                                                NPY_ARRAY_IN_ARRAY);
         if (!array) {
-            PyErr_SetString(PyExc_ValueError, "Failed to convert image to uint8 array");
-            return NULL;
+            return -1;
         }
-        
-        int ndim = PyArray_NDIM(array);
-        npy_intp *dims = PyArray_DIMS(array);
-        
-        if (ndim == 2) {
-            *height = (int)dims[0];
-            *width = (int)dims[1];
-            *depth = 8;
-        } else if (ndim == 3 && dims[2] == 1) {
-            *height = (int)dims[0];
-            *width = (int)dims[1];
-            *depth = 8;
-        } else {
-            PyErr_SetString(PyExc_ValueError, "Image must be 2D grayscale");
+        if (PyArray_NDIM(array) != 2 || PyArray_DIM(array, 1) != 3) {
+            PyErr_SetString(PyExc_ValueError, "Minutiae array must have shape (N, 3)");
             Py_DECREF(array);
-            return NULL;
+            return -1;
         }
         
-        /* Copy data */
-        size_t data_size = (*width) * (*height);
-        data = (unsigned char*)malloc(data_size);
-        if (!data) {
-            PyErr_NoMemory();
-            Py_DECREF(array);
-            return NULL;
+        npy_intp count = PyArray_DIM(array, 0);
+        if (count > MAX_BOZORTH_MINUTIAE) count = MAX_BOZORTH_MINUTIAE;
+        xyt->nrows = (int)count;
+        
+        const npy_int32 *rows = (const npy_int32*)PyArray_DATA(array);
+        for (npy_intp i = 0; i < count; i++) {
+            xyt->xcol[i] = rows[3 * i];
+            xyt->ycol[i] = rows[3 * i + 1];
+            xyt->thetacol[i] = rows[3 * i + 2];
         }
-        memcpy(data, PyArray_DATA(array), data_size);
+        
         Py_DECREF(array);
-    } else {
-        PyErr_SetString(PyExc_TypeError, "Image must be a numpy array");
-        return NULL;
+        return 0;
+    }
+    
+    PyObject *minutiae_list = minutiae_obj;
+    if (!PyList_Check(minutiae_list)) {
+        PyErr_SetString(PyExc_TypeError, "Minutiae must be an (N, 3) array or a list of dictionaries");
+        return -1;
+    }
+    
+    Py_ssize_t count = PyList_Size(minutiae_list);
+    if (count > MAX_BOZORTH_MINUTIAE) count = MAX_BOZORTH_MINUTIAE;
+    xyt->nrows = (int)count;
+    
+    for (Py_ssize_t i = 0; i < count; i++) {
+        PyObject *item = PyList_GetItem(minutiae_list, i);
+        if (!PyDict_Check(item)) {
+            PyErr_SetString(PyExc_TypeError, "Minutiae must be dictionaries");
+            return -1;
+        }
+        
+        PyObject *x_obj = PyDict_GetItemString(item, "x");
+        PyObject *y_obj = PyDict_GetItemString(item, "y");
+        PyObject *t_obj = PyDict_GetItemString(item, "direction");
+        
+        if (!x_obj || !y_obj || !t_obj) {
+            PyErr_SetString(PyExc_ValueError, "Minutiae must have x, y, and direction");
+            return -1;
+        }
+        
+        xyt->xcol[i] = (int)PyLong_AsLong(x_obj);
+        xyt->ycol[i] = (int)PyLong_AsLong(y_obj);
+        xyt->thetacol[i] = (int)PyLong_AsLong(t_obj);
     }
     
-    return data;
+    return 0;
 }
 
 /*******************************************************************************
  * Minutiae Extraction (MINDTCT)
  ******************************************************************************/
 
+/* Build the extract_minutiae result dict. Takes ownership of binarized.
+ *
+ * Minutiae are returned as parallel NumPy arrays (x, y, direction, type,
+ * quality) filled straight from the MINUTIA structs, so no Python object is
+ * created per minutia. */
+static PyObject* build_minutiae_result(MINUTIAE *minutiae, unsigned char *binarized,
+                                       int bw, int bh) {
+    npy_intp n = minutiae->num;
+    PyObject *xs = PyArray_SimpleNew(1, &n, NPY_INT32);
+    PyObject *ys = PyArray_SimpleNew(1, &n, NPY_INT32);
+    PyObject *dirs = PyArray_SimpleNew(1, &n, NPY_UINT8);
+    PyObject *types = PyArray_SimpleNew(1, &n, NPY_INT8);
+    PyObject *quals = PyArray_SimpleNew(1, &n, NPY_FLOAT64);
+    PyObject *result = NULL;
+    
+    if (!xs || !ys || !dirs || !types || !quals) {
+        free(binarized);
+        goto done;
+    }
+    
+    npy_int32 *x = (npy_int32*)PyArray_DATA((PyArrayObject*)xs);
+    npy_int32 *y = (npy_int32*)PyArray_DATA((PyArrayObject*)ys);
+    npy_uint8 *d = (npy_uint8*)PyArray_DATA((PyArrayObject*)dirs);
+    npy_int8 *t = (npy_int8*)PyArray_DATA((PyArrayObject*)types);
+    npy_float64 *q = (npy_float64*)PyArray_DATA((PyArrayObject*)quals);
+    
+    for (npy_intp i = 0; i < n; i++) {
+        MINUTIA *m = minutiae->list[i];
+        x[i] = m->x;
+        y[i] = m->y;
+        d[i] = (npy_uint8)m->direction;
+        t[i] = (npy_int8)m->type;
+        q[i] = m->reliability;
+    }
+    
+    /* Hand the binarized image to NumPy without copying it */
+    PyObject *bin_array = adopt_uint8_buffer(binarized, bh, bw);
+    if (!bin_array) {
+        goto done;
+    }
+    
+    result = Py_BuildValue("{s:O,s:O,s:O,s:O,s:O,s:n,s:N}",
+                           "x", xs,
+                           "y", ys,
+                           "direction", dirs,
+                           "type", types,
+                           "quality", quals,
+                           "count", n,
+                           "binarized", bin_array);
+    
+done:
+    Py_XDECREF(xs);
+    Py_XDECREF(ys);
+    Py_XDECREF(dirs);
+    Py_XDECREF(types);
+    Py_XDECREF(quals);
+    return result;
+}
+
 static PyObject* nbis_extract_minutiae(PyObject *self, PyObject *args, PyObject *kwargs) {
     static char *kwlist[] = {"image", "ppi", NULL};
     PyObject *image_obj = NULL;
@@ -113,10 +267,11 @@ static PyObject* nbis_extract_minutiae(PyObject *self, PyObject *args, PyObject
     
     /* Convert image */
     int width, height, depth;
-    unsigned char *image_data = py_to_image_data(image_obj, &width, &height, &depth);
-    if (!image_data) {
+    PyArrayObject *image = py_to_image_array(image_obj, &width, &height, &depth);
+    if (!image) {
         return NULL;
     }
+    unsigned char *image_data = (unsigned char*)PyArray_DATA(image);
     
     /* Run minutiae detection */
     MINUTIAE *minutiae = NULL;
@@ -128,56 +283,34 @@ static PyObject* nbis_extract_minutiae(PyObject *self, PyObject *args, PyObject
     unsigned char *binarized = NULL;
     int bw, bh;
     
-    int ret = lfs_detect_minutiae_V2(&minutiae,
-                                      &direction_map, &low_contrast_map,
-                                      &low_flow_map, &high_curve_map,
-                                      &map_w, &map_h,
-                                      &binarized, &bw, &bh,
-                                      image_data, width, height,
-                                      &lfsparms_V2);
+    int ret;
+    
+    /* MINDTCT only reads shared state, so other Python threads may run
+     * (including concurrent extractions) while it works. */
+    Py_BEGIN_ALLOW_THREADS
+    ret = lfs_detect_minutiae_V2(&minutiae,
+                                 &direction_map, &low_contrast_map,
+                                 &low_flow_map, &high_curve_map,
+                                 &map_w, &map_h,
+                                 &binarized, &bw, &bh,
+                                 image_data, width, height,
+                                 &lfsparms_V2);
+    Py_END_ALLOW_THREADS
     
-    free(image_data);
+    Py_DECREF(image);
     
     if (ret != 0) {
         PyErr_SetString(PyExc_RuntimeError, "Minutiae detection failed");
         return NULL;
     }
     
-    /* Build result dictionary */
-    PyObject *result = PyDict_New();
-    PyObject *minutiae_list = PyList_New(0);
+    PyObject *result = build_minutiae_result(minutiae, binarized, bw, bh);
     
-    for (int i = 0; i < minutiae->num; i++) {
-        MINUTIA *m = minutiae->list[i];
-        PyObject *min_dict = Py_BuildValue("{s:i,s:i,s:i,s:i,s:d,s:s}",
-            "x", m->x,
-            "y", m->y,
-            "direction", m->direction,
-            "type", m->type,
-            "quality", m->reliability,
-            "type_str", m->type == RIDGE_ENDING ? "ending" : "bifurcation");
-        PyList_Append(minutiae_list, min_dict);
-        Py_DECREF(min_dict);
-    }
-    
-    PyDict_SetItemString(result, "minutiae", minutiae_list);
-    PyDict_SetItemString(result, "count", PyLong_FromLong(minutiae->num));
-    
-    /* Create binarized image array */
-    npy_intp dims[2] = {bh, bw};
-    PyObject *bin_array = PyArray_SimpleNew(2, dims, NPY_UINT8);
-    memcpy(PyArray_DATA((PyArrayObject*)bin_array), binarized, bw * bh);
-    PyDict_SetItemString(result, "binarized", bin_array);
-    
-    /* Cleanup */
-    Py_DECREF(minutiae_list);
-    Py_DECREF(bin_array);
     free_minutiae(minutiae);
     free(direction_map);
     free(low_contrast_map);
     free(low_flow_map);
     free(high_curve_map);
-    free(binarized);
     
     return result;
 }
@@ -217,14 +350,17 @@ static PyObject* nbis_match_fingerprints(PyObject *self, PyObject *args) {
     
     /* Extract minutiae from both images */
     int width1, height1, depth1, width2, height2, depth2;
-    unsigned char *probe_data = py_to_image_data(probe_obj, &width1, &height1, &depth1);
-    unsigned char *gallery_data = py_to_image_data(gallery_obj, &width2, &height2, &depth2);
-    
-    if (!probe_data || !gallery_data) {
-        free(probe_data);
-        free(gallery_data);
+    PyArrayObject *probe = py_to_image_array(probe_obj, &width1, &height1, &depth1);
+    if (!probe) {
         return NULL;
     }
+    PyArrayObject *gallery = py_to_image_array(gallery_obj, &width2, &height2, &depth2);
+    if (!gallery) {
+        Py_DECREF(probe);
+        return NULL;
+    }
+    unsigned char *probe_data = (unsigned char*)PyArray_DATA(probe);
+    unsigned char *gallery_data = (unsigned char*)PyArray_DATA(gallery);
     
     /* Extract minutiae from probe */
     MINUTIAE *probe_min = NULL;
@@ -232,13 +368,16 @@ static PyObject* nbis_match_fingerprints(PyObject *self, PyObject *args) {
     unsigned char *bin1;
     int bw1, bh1;
     
-    int ret1 = lfs_detect_minutiae_V2(&probe_min, &dmap1, &lcm1, &lfm1, &hcm1,
-                                       &mw1, &mh1, &bin1, &bw1, &bh1,
-                                       probe_data, width1, height1, &lfsparms_V2);
-    free(probe_data);
+    int ret1;
+    Py_BEGIN_ALLOW_THREADS
+    ret1 = lfs_detect_minutiae_V2(&probe_min, &dmap1, &lcm1, &lfm1, &hcm1,
+                                  &mw1, &mh1, &bin1, &bw1, &bh1,
+                                  probe_data, width1, height1, &lfsparms_V2);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(probe);
     
     if (ret1 != 0) {
-        free(gallery_data);
+        Py_DECREF(gallery);
         PyErr_SetString(PyExc_RuntimeError, "Probe minutiae detection failed");
         return NULL;
     }
@@ -249,10 +388,13 @@ static PyObject* nbis_match_fingerprints(PyObject *self, PyObject *args) {
     unsigned char *bin2;
     int bw2, bh2;
     
-    int ret2 = lfs_detect_minutiae_V2(&gallery_min, &dmap2, &lcm2, &lfm2, &hcm2,
-                                       &mw2, &mh2, &bin2, &bw2, &bh2,
-                                       gallery_data, width2, height2, &lfsparms_V2);
-    free(gallery_data);
+    int ret2;
+    Py_BEGIN_ALLOW_THREADS
+    ret2 = lfs_detect_minutiae_V2(&gallery_min, &dmap2, &lcm2, &lfm2, &hcm2,
+                                  &mw2, &mh2, &bin2, &bw2, &bh2,
+                                  gallery_data, width2, height2, &lfsparms_V2);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(gallery);
     
     if (ret2 != 0) {
         free_minutiae(probe_min);
@@ -277,7 +419,12 @@ static PyObject* nbis_match_fingerprints(PyObject *self, PyObject *args) {
     }
     
     /* Perform matching */
-    int score = bz_match_score(DEFAULT_BOZORTH_MINUTIAE, probe_xyt, gallery_xyt);
+    int score;
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(bozorth_lock, WAIT_LOCK);
+    score = bozorth_main(probe_xyt, gallery_xyt);
+    PyThread_release_lock(bozorth_lock);
+    Py_END_ALLOW_THREADS
     
     /* Cleanup */
     free(probe_xyt);
@@ -305,20 +452,28 @@ static PyObject* nbis_compute_nfiq(PyObject *self, PyObject *args, PyObject *kwa
     
     /* Convert image */
     int width, height, depth;
-    unsigned char *image_data = py_to_image_data(image_obj, &width, &height, &depth);
-    if (!image_data) {
+    PyArrayObject *image = py_to_image_array(image_obj, &width, &height, &depth);
+    if (!image) {
         return NULL;
     }
+    unsigned char *image_data = (unsigned char*)PyArray_DATA(image);
     
     /* Compute NFIQ */
     int nfiq_value;
     float conf_value;
     int optflag = 0;
     
-    int ret = comp_nfiq(&nfiq_value, &conf_value, image_data, width, height,
-                        depth, ppi, &optflag);
+    int ret;
+    
+    /* The MLP classifier is not reentrant (see nfiq_lock) */
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(nfiq_lock, WAIT_LOCK);
+    ret = comp_nfiq(&nfiq_value, &conf_value, image_data, width, height,
+                    depth, ppi, &optflag);
+    PyThread_release_lock(nfiq_lock);
+    Py_END_ALLOW_THREADS
     
-    free(image_data);
+    Py_DECREF(image);
     
     /* ret: 0=success; >0 are algorithm conditions (e.g., EMPTY_IMG, TOO_FEW_MINUTIAE); <0 indicates system error */
     if (ret < 0) {
@@ -332,6 +487,158 @@ static PyObject* nbis_compute_nfiq(PyObject *self, PyObject *args, PyObject *kwa
                          "return_code", ret);
 }
 
+/* NFIQ from an existing MINDTCT detection; mirrors comp_nfiq_flex() after
+ * its get_minutiae() call. Overwrites the minutiae reliabilities with
+ * NFIQ's combined minutia quality. */
+static int nfiq_from_detection(int *onfiq, float *oconf, MINUTIAE *minutiae,
+                               int *direction_map, int *low_contrast_map,
+                               int *low_flow_map, int *high_curve_map,
+                               int map_w, int map_h,
+                               unsigned char *idata, int iw, int ih, int ppi) {
+    int ret;
+    int *quality_map;
+    int optflag = 0;
+    int class_i;
+    float maxact;
+    float featvctr[NFIQ_VCTRLEN], outacs[NFIQ_NUM_CLASSES];
+    double ippmm = (ppi == UNDEFINED ? DEFAULT_PPI : ppi) / (double)MM_PER_INCH;
+    
+    if ((ret = gen_quality_map(&quality_map, direction_map, low_contrast_map,
+                               low_flow_map, high_curve_map, map_w, map_h))) {
+        return ret;
+    }
+    
+    if ((ret = combined_minutia_quality(minutiae, quality_map, map_w, map_h,
+                                        lfsparms_V2.blocksize,
+                                        idata, iw, ih, 8, ippmm))) {
+        free(quality_map);
+        return ret;
+    }
+    
+    if (minutiae->num <= MIN_MINUTIAE) {
+        free(quality_map);
+        *onfiq = MIN_MINUTIAE_QUAL;
+        *oconf = 1.0;
+        return TOO_FEW_MINUTIAE;
+    }
+    
+    ret = comp_nfiq_featvctr(featvctr, NFIQ_VCTRLEN, minutiae,
+                             quality_map, map_w, map_h, &optflag);
+    free(quality_map);
+    if (ret == EMPTY_IMG) {
+        *onfiq = EMPTY_IMG_QUAL;
+        *oconf = 1.0;
+        return ret;
+    }
+    
+    znorm_fniq_featvctr(featvctr, dflt_znorm_means, dflt_znorm_stds, NFIQ_VCTRLEN);
+    
+    if ((ret = runmlp2(dflt_nInps, dflt_nHids, dflt_nOuts,
+                       dflt_acfunc_hids, dflt_acfunc_outs, dflt_wts,
+                       featvctr, outacs, &class_i, &maxact))) {
+        return ret;
+    }
+    
+    *onfiq = class_i + 1;
+    *oconf = maxact;
+    return 0;
+}
+
+/*******************************************************************************
+ * Combined Analysis (MINDTCT + NFIQ from a single detection pass)
+ ******************************************************************************/
+
+static PyObject* nbis_analyze(PyObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"image", "ppi", NULL};
+    PyObject *image_obj = NULL;
+    int ppi = DEFAULT_PPI;
+    
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|i", kwlist, &image_obj, &ppi)) {
+        return NULL;
+    }
+    
+    int width, height, depth;
+    PyArrayObject *image = py_to_image_array(image_obj, &width, &height, &depth);
+    if (!image) {
+        return NULL;
+    }
+    unsigned char *image_data = (unsigned char*)PyArray_DATA(image);
+    
+    MINUTIAE *minutiae = NULL;
+    int *direction_map = NULL;
+    int *low_contrast_map = NULL;
+    int *low_flow_map = NULL;
+    int *high_curve_map = NULL;
+    int map_w, map_h;
+    unsigned char *binarized = NULL;
+    int bw, bh;
+    
+    int ret;
+    
+    Py_BEGIN_ALLOW_THREADS
+    ret = lfs_detect_minutiae_V2(&minutiae,
+                                 &direction_map, &low_contrast_map,
+                                 &low_flow_map, &high_curve_map,
+                                 &map_w, &map_h,
+                                 &binarized, &bw, &bh,
+                                 image_data, width, height,
+                                 &lfsparms_V2);
+    Py_END_ALLOW_THREADS
+    
+    if (ret != 0) {
+        Py_DECREF(image);
+        PyErr_SetString(PyExc_RuntimeError, "Minutiae detection failed");
+        return NULL;
+    }
+    
+    /* Record the MINDTCT reliabilities before NFIQ replaces them */
+    PyObject *result = build_minutiae_result(minutiae, binarized, bw, bh);
+    
+    int nfiq_value;
+    float conf_value;
+    if (result) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(nfiq_lock, WAIT_LOCK);
+        ret = nfiq_from_detection(&nfiq_value, &conf_value, minutiae,
+                                  direction_map, low_contrast_map,
+                                  low_flow_map, high_curve_map, map_w, map_h,
+                                  image_data, width, height, ppi);
+        PyThread_release_lock(nfiq_lock);
+        Py_END_ALLOW_THREADS
+    }
+    
+    Py_DECREF(image);
+    free_minutiae(minutiae);
+    free(direction_map);
+    free(low_contrast_map);
+    free(low_flow_map);
+    free(high_curve_map);
+    
+    if (!result) {
+        return NULL;
+    }
+    
+    /* ret: 0=success; >0 are algorithm conditions (e.g., EMPTY_IMG, TOO_FEW_MINUTIAE); <0 indicates system error */
+    if (ret < 0) {
+        Py_DECREF(result);
+        PyErr_SetString(PyExc_RuntimeError, "NFIQ computation failed");
+        return NULL;
+    }
+    
+    PyObject *nfiq = Py_BuildValue("{s:i,s:f,s:i}",
+                                   "quality", nfiq_value,
+                                   "confidence", conf_value,
+                                   "return_code", ret);
+    if (!nfiq) {
+        Py_DECREF(result);
+        return NULL;
+    }
+    PyDict_SetItemString(result, "nfiq", nfiq);
+    Py_DECREF(nfiq);
+    
+    return result;
+}
+
 /*******************************************************************************
  * XYT-based Matching (for pre-extracted minutiae)
  ******************************************************************************/
@@ -344,71 +651,92 @@ static PyObject* nbis_match_xyt(PyObject *self, PyObject *args) {
         return NULL;
     }
     
-    if (!PyList_Check(probe_list) || !PyList_Check(gallery_list)) {
-        PyErr_SetString(PyExc_TypeError, "Both arguments must be lists of minutiae");
+    /* Convert Python lists to XYT structures */
+    struct xyt_struct probe_xyt, gallery_xyt;
+    
+    if (py_to_xyt(probe_list, &probe_xyt) < 0 ||
+        py_to_xyt(gallery_list, &gallery_xyt) < 0) {
         return NULL;
     }
     
-    /* Convert Python lists to XYT structures */
-    struct xyt_struct probe_xyt, gallery_xyt;
+    /* Perform matching */
+    int score;
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(bozorth_lock, WAIT_LOCK);
+    score = bozorth_main(&probe_xyt, &gallery_xyt);
+    PyThread_release_lock(bozorth_lock);
+    Py_END_ALLOW_THREADS
+    
+    return PyLong_FromLong(score);
+}
+
+static PyObject* nbis_match_xyt_many(PyObject *self, PyObject *args) {
+    PyObject *probe_list = NULL;
+    PyObject *gallery_seq = NULL;
+    
+    if (!PyArg_ParseTuple(args, "OO", &probe_list, &gallery_seq)) {
+        return NULL;
+    }
     
-    Py_ssize_t probe_count = PyList_Size(probe_list);
-    Py_ssize_t gallery_count = PyList_Size(gallery_list);
+    struct xyt_struct probe_xyt;
     
-    if (probe_count > MAX_BOZORTH_MINUTIAE) probe_count = MAX_BOZORTH_MINUTIAE;
-    if (gallery_count > MAX_BOZORTH_MINUTIAE) gallery_count = MAX_BOZORTH_MINUTIAE;
+    if (py_to_xyt(probe_list, &probe_xyt) < 0) {
+        return NULL;
+    }
     
-    probe_xyt.nrows = (int)probe_count;
-    gallery_xyt.nrows = (int)gallery_count;
+    PyObject *galleries = PySequence_Fast(gallery_seq, "Gallery must be a sequence of minutiae");
+    if (!galleries) {
+        return NULL;
+    }
     
-    /* Parse probe minutiae */
-    for (Py_ssize_t i = 0; i < probe_count; i++) {
-        PyObject *item = PyList_GetItem(probe_list, i);
-        if (!PyDict_Check(item)) {
-            PyErr_SetString(PyExc_TypeError, "Minutiae must be dictionaries");
-            return NULL;
-        }
-        
-        PyObject *x_obj = PyDict_GetItemString(item, "x");
-        PyObject *y_obj = PyDict_GetItemString(item, "y");
-        PyObject *t_obj = PyDict_GetItemString(item, "direction");
-        
-        if (!x_obj || !y_obj || !t_obj) {
-            PyErr_SetString(PyExc_ValueError, "Minutiae must have x, y, and direction");
-            return NULL;
+    /* Convert every gallery entry with the GIL held before taking the lock,
+     * so no Python code (which could re-enter the extension) runs under it */
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(galleries);
+    struct xyt_struct *gallery_xyts = NULL;
+    int *scores = NULL;
+    if (n > 0) {
+        gallery_xyts = (struct xyt_struct*)malloc(n * sizeof(struct xyt_struct));
+        scores = (int*)malloc(n * sizeof(int));
+        if (!gallery_xyts || !scores) {
+            free(gallery_xyts);
+            free(scores);
+            Py_DECREF(galleries);
+            return PyErr_NoMemory();
         }
-        
-        probe_xyt.xcol[i] = (int)PyLong_AsLong(x_obj);
-        probe_xyt.ycol[i] = (int)PyLong_AsLong(y_obj);
-        probe_xyt.thetacol[i] = (int)PyLong_AsLong(t_obj);
     }
-    
-    /* Parse gallery minutiae */
-    for (Py_ssize_t i = 0; i < gallery_count; i++) {
-        PyObject *item = PyList_GetItem(gallery_list, i);
-        if (!PyDict_Check(item)) {
-            PyErr_SetString(PyExc_TypeError, "Minutiae must be dictionaries");
+    for (Py_ssize_t i = 0; i < n; i++) {
+        if (py_to_xyt(PySequence_Fast_GET_ITEM(galleries, i), &gallery_xyts[i]) < 0) {
+            free(gallery_xyts);
+            free(scores);
+            Py_DECREF(galleries);
             return NULL;
         }
-        
-        PyObject *x_obj = PyDict_GetItemString(item, "x");
-        PyObject *y_obj = PyDict_GetItemString(item, "y");
-        PyObject *t_obj = PyDict_GetItemString(item, "direction");
-        
-        if (!x_obj || !y_obj || !t_obj) {
-            PyErr_SetString(PyExc_ValueError, "Minutiae must have x, y, and direction");
-            return NULL;
+    }
+    Py_DECREF(galleries);
+    
+    /* Build the probe's edge table once; it stays valid in Bozorth's
+     * probe-side globals for every gallery comparison below */
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(bozorth_lock, WAIT_LOCK);
+    int probe_len = bozorth_probe_init(&probe_xyt);
+    for (Py_ssize_t i = 0; i < n; i++) {
+        scores[i] = bozorth_to_gallery(probe_len, &probe_xyt, &gallery_xyts[i]);
+    }
+    PyThread_release_lock(bozorth_lock);
+    Py_END_ALLOW_THREADS
+    free(gallery_xyts);
+    
+    PyObject *result = PyList_New(n);
+    for (Py_ssize_t i = 0; result && i < n; i++) {
+        PyObject *score = PyLong_FromLong(scores[i]);
+        if (!score) {
+            Py_CLEAR(result);
+            break;
         }
-        
-        gallery_xyt.xcol[i] = (int)PyLong_AsLong(x_obj);
-        gallery_xyt.ycol[i] = (int)PyLong_AsLong(y_obj);
-        gallery_xyt.thetacol[i] = (int)PyLong_AsLong(t_obj);
+        PyList_SET_ITEM(result, i, score);
     }
-    
-    /* Perform matching */
-    int score = bz_match_score(DEFAULT_BOZORTH_MINUTIAE, &probe_xyt, &gallery_xyt);
-    
-    return PyLong_FromLong(score);
+    free(scores);
+    return result;
 }
 
 /*******************************************************************************
@@ -416,29 +744,32 @@ static PyObject* nbis_match_xyt(PyObject *self, PyObject *args) {
  ******************************************************************************/
 
 static PyObject* nbis_decode_wsq(PyObject* self, PyObject* args) {
-    PyObject *wsq_bytes_obj;
-    unsigned char *wsq_data;
-    Py_ssize_t wsq_len;
+    Py_buffer wsq_buffer;
     unsigned char *decoded_data = NULL;
     int width, height, depth, ppi, lossyflag;
     int ret;
-    npy_intp dims[2];
-    PyArrayObject *result_array;
     
-    /* Parse arguments: bytes object containing WSQ data */
-    if (!PyArg_ParseTuple(args, "O", &wsq_bytes_obj)) {
+    /* Parse arguments: any bytes-like object (bytes, memoryview, mmap, ...)
+     * containing WSQ data; it is read in place without copying */
+    if (!PyArg_ParseTuple(args, "y*", &wsq_buffer)) {
         return NULL;
     }
     
-    /* Get buffer from bytes object */
-    if (PyBytes_AsStringAndSize(wsq_bytes_obj, (char**)&wsq_data, &wsq_len) < 0) {
-        PyErr_SetString(PyExc_TypeError, "Expected bytes object");
+    if (wsq_buffer.len > INT_MAX) {
+        PyBuffer_Release(&wsq_buffer);
+        PyErr_SetString(PyExc_ValueError, "WSQ data is too large");
         return NULL;
     }
     
     /* Decode WSQ data */
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(wsq_lock, WAIT_LOCK);
     ret = wsq_decode_mem(&decoded_data, &width, &height, &depth, &ppi, &lossyflag,
-                        wsq_data, (int)wsq_len);
+                        (unsigned char*)wsq_buffer.buf, (int)wsq_buffer.len);
+    PyThread_release_lock(wsq_lock);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&wsq_buffer);
     
     if (ret != 0) {
         if (decoded_data) free(decoded_data);
@@ -452,24 +783,14 @@ static PyObject* nbis_decode_wsq(PyObject* self, PyObject* args) {
         return NULL;
     }
     
-    /* Create NumPy array */
-    dims[0] = height;
-    dims[1] = width;
-    result_array = (PyArrayObject*)PyArray_SimpleNew(2, dims, NPY_UINT8);
-    
-    if (result_array == NULL) {
-        free(decoded_data);
+    /* Hand the decoded image to NumPy without copying it */
+    PyObject *result_array = adopt_uint8_buffer(decoded_data, height, width);
+    if (!result_array) {
         return NULL;
     }
     
-    /* Copy data to array */
-    memcpy(PyArray_DATA(result_array), decoded_data, height * width);
-    
-    /* Free NBIS-allocated memory */
-    free(decoded_data);
-    
     /* Return tuple (image, ppi, lossyflag) */
-    return Py_BuildValue("(Oii)", result_array, ppi, lossyflag);
+    return Py_BuildValue("(Nii)", result_array, ppi, lossyflag);
 }
 
 /*******************************************************************************
@@ -483,7 +804,17 @@ static PyMethodDef NBISMethods[] = {
      "    image: numpy array (grayscale, uint8)\n"
      "    ppi: pixels per inch (default: 500)\n\n"
      "Returns:\n"
-     "    dict with keys: 'minutiae' (list), 'count' (int), 'binarized' (array)"},
+     "    dict with keys: 'x', 'y' (int32 arrays), 'direction' (uint8 array,\n"
+     "    NBIS units 0-31), 'type' (int8 array), 'quality' (float64 array),\n"
+     "    'count' (int), 'binarized' (uint8 array)"},
+    
+    {"analyze", (PyCFunction)nbis_analyze, METH_VARARGS | METH_KEYWORDS,
+     "Extract minutiae and compute NFIQ from a single MINDTCT detection.\n\n"
+     "Args:\n"
+     "    image: numpy array (grayscale, uint8)\n"
+     "    ppi: pixels per inch (default: 500)\n\n"
+     "Returns:\n"
+     "    dict with the extract_minutiae keys plus 'nfiq' (compute_nfiq dict)"},
     
     {"match_fingerprints", nbis_match_fingerprints, METH_VARARGS,
      "Match two fingerprint images (1:1 comparison).\n\n"
@@ -504,15 +835,28 @@ static PyMethodDef NBISMethods[] = {
     {"match_xyt", nbis_match_xyt, METH_VARARGS,
      "Match two sets of pre-extracted minutiae.\n\n"
      "Args:\n"
-     "    probe: list of minutiae dicts with keys: x, y, direction\n"
-     "    gallery: list of minutiae dicts with keys: x, y, direction\n\n"
+     "    probe: (N, 3) int array of x, y, direction rows, or list of\n"
+     "           minutiae dicts with keys: x, y, direction\n"
+     "    gallery: same format as probe\n\n"
      "Returns:\n"
      "    int: match score (higher = better match)"},
     
+    {"match_xyt_many", nbis_match_xyt_many, METH_VARARGS,
+     "Match one set of pre-extracted minutiae against many (1:N comparison).\n\n"
+     "The probe's Bozorth3 edge table is built once and reused for every\n"
+     "gallery entry.\n\n"
+     "Args:\n"
+     "    probe: (N, 3) int array of x, y, direction rows, or list of\n"
+     "           minutiae dicts with keys: x, y, direction\n"
+     "    galleries: sequence of minutiae (same format as probe), one per\n"
+     "               gallery print\n\n"
+     "Returns:\n"
+     "    list of int: match scores in gallery order"},
+    
     {"decode_wsq", nbis_decode_wsq, METH_VARARGS,
      "Decode WSQ compressed fingerprint image.\n\n"
      "Args:\n"
-     "    wsq_data: bytes object containing WSQ compressed data\n\n"
+     "    wsq_data: bytes-like object containing WSQ compressed data\n\n"
      "Returns:\n"
      "    tuple: (image array, ppi, lossyflag)"},
     
@@ -533,5 +877,17 @@ PyMODINIT_FUNC PyInit__nbis_ext(void) {
     if (errorfp == NULL) {
         errorfp = stderr;
     }
+    if (bozorth_lock == NULL) {
+        bozorth_lock = PyThread_allocate_lock();
+    }
+    if (wsq_lock == NULL) {
+        wsq_lock = PyThread_allocate_lock();
+    }
+    if (nfiq_lock == NULL) {
+        nfiq_lock = PyThread_allocate_lock();
+    }
+    if (bozorth_lock == NULL || wsq_lock == NULL || nfiq_lock == NULL) {
+        return PyErr_NoMemory();
+    }
     return PyModule_Create(&nbismodule);
 }
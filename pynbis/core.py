@@ -3,9 +3,11 @@
 Core functionality for PyNBIS fingerprint processing.
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional, Tuple, Union
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+import struct
 import numpy as np
 import numpy.typing as npt
 
@@ -16,6 +18,30 @@ except ImportError:
     _nbis_ext = None
 
 
+# ISO/IEC 19794-2:2005 finger minutiae record layout
+_ISO_FORMAT_ID = b"FMR\x00"
+_ISO_VERSION = b" 20\x00"
+_ISO_HEADER = struct.Struct(">4s4sIHHHHHBB")
+_ISO_VIEW = struct.Struct(">BBBB")
+_ISO_MINUTIA = np.dtype([
+    ("type_x", ">u2"),   # 2-bit type, 14-bit x
+    ("y", ">u2"),        # 2 reserved bits, 14-bit y
+    ("angle", "u1"),     # units of 360/256 degrees
+    ("quality", "u1"),   # 0-100
+])
+_ISO_MAX_MINUTIAE = 255
+_CM_PER_INCH = 2.54
+
+# NBIS minutia directions are quantized into 11.25 degree steps
+NUM_DIRECTIONS = 32
+
+# Unit direction vectors in image coordinates for each NBIS direction
+# (clockwise from north)
+_DIRECTION_ANGLES = np.arange(NUM_DIRECTIONS) * (2 * np.pi / NUM_DIRECTIONS)
+_DIRECTION_DX = np.sin(_DIRECTION_ANGLES)
+_DIRECTION_DY = -np.cos(_DIRECTION_ANGLES)
+
+
 class MinutiaType(Enum):
     """Minutia type enumeration."""
     RIDGE_ENDING = 0
@@ -23,15 +49,19 @@ class MinutiaType(Enum):
     UNKNOWN = -1
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Minutia:
     """
     Represents a fingerprint minutia point.
     
+    Minutia objects are immutable and hashable, and use ``__slots__`` so
+    large collections carry no per-instance ``__dict__``.
+    
     Attributes:
         x: X-coordinate in pixels
         y: Y-coordinate in pixels
-        direction: Direction/angle (0-359 degrees or NBIS internal format)
+        direction: Direction in NBIS units of 11.25 degrees clockwise from
+            north (0-31)
         minutia_type: Type of minutia (ending or bifurcation)
         quality: Quality/reliability score (0.0-1.0)
     """
@@ -52,6 +82,107 @@ class Minutia:
         }
 
 
+_MINUTIA_TYPES = {t.value: t for t in MinutiaType}
+
+# Descriptions of NFIQ levels 1-5
+_QUALITY_DESC = ("Excellent", "Very Good", "Good", "Fair", "Poor")
+
+
+class Minutiae:
+    """
+    Minutiae stored as parallel NumPy arrays (struct-of-arrays).
+    
+    Numeric work (counting, filtering, export) should use the arrays
+    directly. Iterating or indexing with an integer yields Minutia objects,
+    so the container can still be used like a list of minutiae; indexing
+    with a slice or mask returns another Minutiae.
+    
+    Attributes:
+        xs: X-coordinates in pixels (int32)
+        ys: Y-coordinates in pixels (int32)
+        dirs: Directions in NBIS units of 11.25 degrees, 0-31 (uint8)
+        types: MinutiaType values (int8)
+        quals: Quality/reliability scores (float64)
+    """
+    
+    __slots__ = ('xs', 'ys', 'dirs', 'types', 'quals')
+    
+    def __init__(self, xs, ys, dirs, types, quals):
+        """
+        Raises:
+            ValueError: If a direction is outside the NBIS range 0-31
+        """
+        self.xs = np.asarray(xs, dtype=np.int32)
+        self.ys = np.asarray(ys, dtype=np.int32)
+        dirs = np.asarray(dirs)
+        if dirs.size and (dirs.min() < 0 or dirs.max() >= NUM_DIRECTIONS):
+            raise ValueError(
+                f"Minutia directions must be NBIS units 0-{NUM_DIRECTIONS - 1} "
+                f"(11.25 degrees each), got values in {dirs.min()}..{dirs.max()}")
+        self.dirs = dirs.astype(np.uint8, copy=False)
+        self.types = np.asarray(types, dtype=np.int8)
+        self.quals = np.asarray(quals, dtype=np.float64)
+    
+    @classmethod
+    def from_list(cls, minutiae: Sequence[Minutia]) -> 'Minutiae':
+        """Build a Minutiae container from Minutia objects."""
+        return cls(
+            xs=[m.x for m in minutiae],
+            ys=[m.y for m in minutiae],
+            dirs=[m.direction for m in minutiae],
+            types=[m.minutia_type.value for m in minutiae],
+            quals=[m.quality for m in minutiae],
+        )
+    
+    def to_dicts(self) -> List[dict]:
+        """Convert to a list of dictionaries (see Minutia.to_dict)."""
+        return [
+            {'x': x, 'y': y, 'direction': d, 'type': t, 'quality': q}
+            for x, y, d, t, q in zip(self.xs.tolist(), self.ys.tolist(),
+                                     self.dirs.tolist(), self.types.tolist(),
+                                     self.quals.tolist())
+        ]
+    
+    def to_xyt(self) -> npt.NDArray[np.int32]:
+        """Stack x, y and direction into the ``(N, 3)`` int32 matcher input."""
+        return np.column_stack((self.xs, self.ys, self.dirs)).astype(np.int32, copy=False)
+    
+    def __len__(self) -> int:
+        return len(self.xs)
+    
+    def __iter__(self) -> Iterator[Minutia]:
+        for x, y, d, t, q in zip(self.xs.tolist(), self.ys.tolist(),
+                                 self.dirs.tolist(), self.types.tolist(),
+                                 self.quals.tolist()):
+            yield Minutia(x, y, d, _MINUTIA_TYPES[t], q)
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Minutia(int(self.xs[index]), int(self.ys[index]),
+                           int(self.dirs[index]),
+                           _MINUTIA_TYPES[int(self.types[index])],
+                           float(self.quals[index]))
+        return Minutiae(self.xs[index], self.ys[index], self.dirs[index],
+                        self.types[index], self.quals[index])
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Minutiae):
+            return all(np.array_equal(getattr(self, f), getattr(other, f))
+                       for f in self.__slots__)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"Minutiae({len(self)} minutiae)"
+
+
+# MinutiaType value <-> ISO/IEC 19794-2 minutia type code
+_ISO_TYPE_CODES = np.array([1, 2, 0], dtype=np.uint16)  # indexed by value (-1 wraps)
+_ISO_TYPES = np.array([-1, MinutiaType.RIDGE_ENDING.value,
+                       MinutiaType.BIFURCATION.value, -1], dtype=np.int8)
+
+
 @dataclass
 class MatchResult:
     """
@@ -87,8 +218,7 @@ class QualityResult:
     return_code: int
     
     def __str__(self) -> str:
-        quality_desc = ["Excellent", "Very Good", "Good", "Fair", "Poor"]
-        desc = quality_desc[self.quality - 1] if 1 <= self.quality <= 5 else "Unknown"
+        desc = _QUALITY_DESC[self.quality - 1] if 1 <= self.quality <= 5 else "Unknown"
         return f"Quality: {self.quality}/5 ({desc}), Confidence: {self.confidence:.3f}"
 
 
@@ -113,6 +243,28 @@ class Fingerprint:
             image: Grayscale fingerprint image (2D numpy array, uint8)
             ppi: Pixels per inch (default: 500)
         
+        Raises:
+            ValueError: If image format is invalid
+        """
+        self.image = image
+        self.ppi = ppi
+    
+    @property
+    def image(self) -> Optional[npt.NDArray[np.uint8]]:
+        """Grayscale fingerprint image (None for template-only fingerprints)."""
+        return self._image
+    
+    @image.setter
+    def image(self, image: Optional[npt.NDArray[np.uint8]]) -> None:
+        if image is not None:
+            image = self._validate(image)
+        self._set_image(image)
+    
+    @staticmethod
+    def _validate(image: npt.NDArray) -> npt.NDArray[np.uint8]:
+        """
+        Check an input image and return a read-only, C-contiguous 2D view.
+        
         Raises:
             ValueError: If image format is invalid
         """
@@ -122,49 +274,70 @@ class Fingerprint:
         if image.dtype != np.uint8:
             raise ValueError("Image must be uint8 dtype")
         
-        if image.ndim not in [2, 3]:
-            raise ValueError("Image must be 2D or 3D array")
-        
         # Convert to 2D if needed
         if image.ndim == 3:
-            if image.shape[2] == 1:
-                image = image[:, :, 0]
-            else:
+            if image.shape[2] != 1:
                 raise ValueError("Color images not supported, use grayscale")
+            image = image.squeeze(2)
+        elif image.ndim != 2:
+            raise ValueError("Image must be 2D or 3D array")
         
-        self.image = image
-        self.ppi = ppi
-        self.minutiae: Optional[List[Minutia]] = None
+        # Keep a read-only, C-contiguous view of the caller's array: the
+        # extension reads it in place, and cached results can't go stale
+        # through writes to fp.image
+        image = np.ascontiguousarray(image).view()
+        image.flags.writeable = False
+        return image
+    
+    @classmethod
+    def _trusted(cls, image: npt.NDArray[np.uint8], ppi: int = 500) -> 'Fingerprint':
+        """
+        Create a Fingerprint without validating the image.
+        
+        For internal callers whose images are known to be read-only,
+        C-contiguous 2D uint8 arrays (e.g. GalleryStore records).
+        """
+        fp = cls.__new__(cls)
+        fp._set_image(image)
+        fp.ppi = ppi
+        return fp
+    
+    def _set_image(self, image: Optional[npt.NDArray[np.uint8]]) -> None:
+        if image is not None:
+            self._shape: Tuple[int, int] = image.shape[:2]
+        
+        # Results derived from the previous image no longer apply
+        self._image = image
+        self.minutiae = None
         self.quality: Optional[QualityResult] = None
         self._binarized: Optional[npt.NDArray[np.uint8]] = None
+        self._extracted: Optional[Minutiae] = None
+        self._analysis: Optional[Tuple[Minutiae, QualityResult]] = None
     
-    def extract_minutiae(self) -> List[Minutia]:
+    @property
+    def minutiae(self) -> Optional[Minutiae]:
+        """Extracted minutiae (None until extract_minutiae is called)."""
+        return self._minutiae
+    
+    @minutiae.setter
+    def minutiae(self, value: Optional[Union[Minutiae, Sequence[Minutia]]]) -> None:
+        if value is not None and not isinstance(value, Minutiae):
+            value = Minutiae.from_list(value)
+        self._minutiae = value
+        self._xyt: Optional[npt.NDArray[np.int32]] = None
+    
+    def extract_minutiae(self) -> Minutiae:
         """
         Extract minutiae from the fingerprint image.
         
         Returns:
-            List of Minutia objects
+            Minutiae container
         
         Raises:
             RuntimeError: If minutiae extraction fails
+            ValueError: If the fingerprint was loaded from a template
         """
-        if _nbis_ext is None:
-            raise RuntimeError("NBIS extension not available")
-        
-        result = _nbis_ext.extract_minutiae(self.image, self.ppi)
-        
-        self.minutiae = []
-        for m_dict in result['minutiae']:
-            minutia_type = MinutiaType.BIFURCATION if m_dict['type'] == 1 else MinutiaType.RIDGE_ENDING
-            self.minutiae.append(Minutia(
-                x=m_dict['x'],
-                y=m_dict['y'],
-                direction=m_dict['direction'],
-                minutia_type=minutia_type,
-                quality=m_dict['quality']
-            ))
-        
-        self._binarized = result['binarized']
+        self.minutiae = self._detect()
         return self.minutiae
     
     def compute_quality(self) -> QualityResult:
@@ -176,17 +349,89 @@ class Fingerprint:
         
         Raises:
             RuntimeError: If quality computation fails
+            ValueError: If the fingerprint was loaded from a template
+        """
+        self.quality = self._analyze()[1]
+        return self.quality
+    
+    def analyze(self) -> 'Fingerprint':
+        """
+        Extract minutiae and compute NFIQ quality in a single detection pass.
+        
+        Gives the same results as calling extract_minutiae() and
+        compute_quality(), but runs MINDTCT once instead of twice.
+        
+        Returns:
+            This Fingerprint, with minutiae and quality populated
+        
+        Raises:
+            RuntimeError: If detection or quality computation fails
+            ValueError: If the fingerprint was loaded from a template
+        
+        Example:
+            >>> fp = Fingerprint(image).analyze()
+            >>> print(fp.quality.quality, len(fp.minutiae))
+        """
+        self.minutiae, self.quality = self._analyze()
+        return self
+    
+    def _detect(self) -> Minutiae:
+        """
+        Run MINDTCT alone (no NFIQ), reusing any earlier detection.
+        
+        The result is cached until the image is replaced.
         """
+        if self._extracted is not None:
+            return self._extracted
+        if self._analysis is not None:
+            return self._analysis[0]
+        
         if _nbis_ext is None:
             raise RuntimeError("NBIS extension not available")
+        self._require_image()
         
-        result = _nbis_ext.compute_nfiq(self.image, self.ppi)
-        self.quality = QualityResult(
-            quality=result['quality'],
-            confidence=result['confidence'],
-            return_code=result['return_code']
+        result = _nbis_ext.extract_minutiae(self.image, self.ppi)
+        self._binarized = result['binarized']
+        self._extracted = self._minutiae_from(result)
+        return self._extracted
+    
+    @staticmethod
+    def _minutiae_from(result: dict) -> Minutiae:
+        # NBIS minutia types are 0/1, stored as MinutiaType values as-is
+        return Minutiae(
+            xs=result['x'],
+            ys=result['y'],
+            dirs=result['direction'],
+            types=result['type'],
+            quals=result['quality'],
         )
-        return self.quality
+    
+    def _analyze(self) -> Tuple[Minutiae, QualityResult]:
+        """
+        Run MINDTCT once and derive both minutiae and NFIQ from it.
+        
+        The result is cached until the image is replaced, so calling
+        analyze() or compute_quality() again does not repeat the work.
+        """
+        if self._analysis is not None:
+            return self._analysis
+        
+        if _nbis_ext is None:
+            raise RuntimeError("NBIS extension not available")
+        self._require_image()
+        
+        result = _nbis_ext.analyze(self.image, self.ppi)
+        minutiae = self._minutiae_from(result)
+        nfiq = result['nfiq']
+        quality = QualityResult(
+            quality=nfiq['quality'],
+            confidence=nfiq['confidence'],
+            return_code=nfiq['return_code']
+        )
+        
+        self._binarized = result['binarized']
+        self._analysis = (minutiae, quality)
+        return self._analysis
     
     def match(self, other: 'Fingerprint', threshold: Optional[int] = None) -> MatchResult:
         """
@@ -205,6 +450,13 @@ class Fingerprint:
         if _nbis_ext is None:
             raise RuntimeError("NBIS extension not available")
         
+        # Reuse minutiae that were already extracted instead of running
+        # MINDTCT on both images again inside the extension.
+        if self.minutiae is not None and other.minutiae is not None:
+            return self.matcher_context().match(other, threshold)
+        self._require_image()
+        other._require_image()
+        
         score = _nbis_ext.match_fingerprints(self.image, other.image)
         
         matched = None
@@ -218,22 +470,239 @@ class Fingerprint:
             matched=matched
         )
     
+    def to_iso_template(self) -> bytes:
+        """
+        Encode the minutiae as an ISO/IEC 19794-2:2005 finger minutiae record.
+        
+        Minutiae are extracted first if that has not happened yet. A record
+        holds at most 255 minutiae; larger sets keep the 255 with the
+        highest quality. Qualities are stored with a precision of 0.01.
+        
+        Returns:
+            Template bytes
+        
+        Example:
+            >>> Path('probe.fmr').write_bytes(fp.to_iso_template())
+        """
+        if self.minutiae is None:
+            self.extract_minutiae()
+        
+        minutiae = self.minutiae
+        if len(minutiae) > _ISO_MAX_MINUTIAE:
+            keep = np.argsort(-minutiae.quals, kind='stable')[:_ISO_MAX_MINUTIAE]
+            minutiae = minutiae[np.sort(keep)]
+        
+        records = np.zeros(len(minutiae), dtype=_ISO_MINUTIA)
+        records['type_x'] = (_ISO_TYPE_CODES[minutiae.types] << 14) | minutiae.xs
+        records['y'] = minutiae.ys
+        # NBIS directions are 11.25 degree units pointing clockwise from north;
+        # ISO angles are 360/256 degree units counter-clockwise from east.
+        # uint8 arithmetic wraps modulo 256, which is exactly the ISO circle.
+        records['angle'] = 64 - 8 * minutiae.dirs
+        records['quality'] = np.clip(np.rint(minutiae.quals * 100), 0, 100)
+        
+        height, width = self._shape
+        ppcm = round(self.ppi / _CM_PER_INCH)
+        length = _ISO_HEADER.size + _ISO_VIEW.size + records.nbytes + 2
+        
+        return b"".join((
+            _ISO_HEADER.pack(_ISO_FORMAT_ID, _ISO_VERSION, length, 0,
+                             width, height, ppcm, ppcm, 1, 0),
+            _ISO_VIEW.pack(0, 0, 0, len(records)),
+            records.tobytes(),
+            b"\x00\x00",  # no extended data
+        ))
+    
+    @classmethod
+    def from_iso_template(cls, data: bytes) -> 'Fingerprint':
+        """
+        Create a Fingerprint from an ISO/IEC 19794-2:2005 finger minutiae record.
+        
+        The result carries minutiae but no image, so it can be matched but
+        not re-extracted or quality-assessed. Only the first finger view is
+        read.
+        
+        Args:
+            data: Template bytes (see to_iso_template)
+        
+        Returns:
+            Fingerprint with minutiae populated
+        
+        Raises:
+            ValueError: If data is not a valid finger minutiae record
+        """
+        if len(data) < _ISO_HEADER.size + _ISO_VIEW.size:
+            raise ValueError("Template is too short")
+        
+        (format_id, _, _, _, width, height, xres, _,
+         num_views, _) = _ISO_HEADER.unpack_from(data)
+        if format_id != _ISO_FORMAT_ID:
+            raise ValueError("Not an ISO/IEC 19794-2 finger minutiae record")
+        if num_views < 1:
+            raise ValueError("Template contains no finger views")
+        
+        count = _ISO_VIEW.unpack_from(data, _ISO_HEADER.size)[3]
+        offset = _ISO_HEADER.size + _ISO_VIEW.size
+        if len(data) < offset + count * _ISO_MINUTIA.itemsize:
+            raise ValueError("Template is truncated")
+        records = np.frombuffer(data, dtype=_ISO_MINUTIA, count=count, offset=offset)
+        
+        fp = cls.__new__(cls)
+        fp.image = None
+        fp.ppi = round(xres * _CM_PER_INCH)
+        fp._shape = (height, width)
+        
+        type_x = records['type_x'].astype(np.int32)
+        angle = records['angle'].astype(np.int32)
+        fp.minutiae = Minutiae(
+            xs=type_x & 0x3FFF,
+            ys=records['y'] & 0x3FFF,
+            dirs=np.rint(((64 - angle) % 256) / 8).astype(np.int32) % NUM_DIRECTIONS,
+            types=_ISO_TYPES[type_x >> 14],
+            quals=records['quality'] / 100,
+        )
+        return fp
+    
+    def _require_image(self) -> None:
+        if self.image is None:
+            raise ValueError("Fingerprint was loaded from a template and has no image")
+    
+    def matcher_context(self) -> 'MatcherContext':
+        """
+        Prepare this fingerprint as the probe of a 1:N search.
+        
+        Minutiae are extracted first if that has not happened yet.
+        
+        Returns:
+            MatcherContext bound to this fingerprint
+        
+        Example:
+            >>> ctx = probe.matcher_context()
+            >>> results = ctx.match_many(gallery)
+        """
+        return MatcherContext(self)
+    
+    def _matcher_xyt(self) -> npt.NDArray[np.int32]:
+        """Matcher payload for these minutiae, built once per extraction."""
+        if self.minutiae is None:
+            self.extract_minutiae()
+        if self._xyt is None:
+            self._xyt = self.minutiae.to_xyt()
+        return self._xyt
+    
     @property
     def binarized_image(self) -> Optional[npt.NDArray[np.uint8]]:
         """Get the binarized fingerprint image (if minutiae have been extracted)."""
         return self._binarized
     
     def __repr__(self) -> str:
-        shape_str = f"{self.image.shape[0]}x{self.image.shape[1]}"
+        shape_str = f"{self._shape[0]}x{self._shape[1]}"
         min_str = f", {len(self.minutiae)} minutiae" if self.minutiae else ""
         qual_str = f", quality={self.quality.quality}" if self.quality else ""
         return f"Fingerprint({shape_str}{min_str}{qual_str})"
 
 
+class MatcherContext:
+    """
+    Probe-side matcher state reused across many gallery comparisons.
+    
+    The probe's minutiae are converted to the matcher's XYT payload once.
+    ``match_many`` hands the whole gallery to Bozorth3 in a single call, so
+    the probe's pairwise edge table is also built only once per search.
+    
+    Attributes:
+        probe: The probe Fingerprint
+    """
+    
+    def __init__(self, probe: Fingerprint):
+        """
+        Initialize a MatcherContext.
+        
+        Args:
+            probe: Probe fingerprint (minutiae are extracted if needed)
+        
+        Raises:
+            RuntimeError: If the NBIS extension is not available
+        """
+        if _nbis_ext is None:
+            raise RuntimeError("NBIS extension not available")
+        
+        self.probe = probe
+        self._probe_xyt = probe._matcher_xyt()
+    
+    def _result(self, score: int, other: Fingerprint,
+                threshold: Optional[int]) -> MatchResult:
+        return MatchResult(
+            score=score,
+            probe_minutiae=len(self.probe.minutiae),
+            gallery_minutiae=len(other.minutiae),
+            matched=score >= threshold if threshold is not None else None
+        )
+    
+    def match(self, other: Fingerprint, threshold: Optional[int] = None) -> MatchResult:
+        """
+        Match the probe against a single gallery fingerprint.
+        
+        Args:
+            other: Gallery Fingerprint (minutiae are extracted if needed)
+            threshold: Optional threshold for binary match decision
+        
+        Returns:
+            MatchResult object
+        """
+        score = _nbis_ext.match_xyt(self._probe_xyt, other._matcher_xyt())
+        return self._result(score, other, threshold)
+    
+    def scores(self, gallery: List[Fingerprint],
+               workers: Optional[int] = None) -> npt.NDArray[np.int32]:
+        """
+        Score the probe against every fingerprint in a gallery.
+        
+        Bozorth3 keeps its edge tables in process globals, so parallel
+        scoring shards the gallery across worker processes rather than
+        threads. Each worker builds the probe table once for its shard.
+        
+        Args:
+            gallery: Gallery Fingerprints (minutiae are extracted if needed)
+            workers: Number of worker processes (default: score in-process)
+        
+        Returns:
+            Array of match scores in gallery order
+        """
+        gallery_xyt = [fp._matcher_xyt() for fp in gallery]
+        if workers is None or workers <= 1 or len(gallery_xyt) < 2 * workers:
+            scores = _nbis_ext.match_xyt_many(self._probe_xyt, gallery_xyt)
+            return np.array(scores, dtype=np.int32)
+        
+        shard_size = -(-len(gallery_xyt) // workers)
+        shards = [gallery_xyt[i:i + shard_size]
+                  for i in range(0, len(gallery_xyt), shard_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_nbis_ext.match_xyt_many,
+                             [self._probe_xyt] * len(shards), shards)
+            return np.array([s for part in parts for s in part], dtype=np.int32)
+    
+    def match_many(self, gallery: List[Fingerprint],
+                   threshold: Optional[int] = None) -> List[MatchResult]:
+        """
+        Match the probe against every fingerprint in a gallery.
+        
+        Args:
+            gallery: Gallery Fingerprints (minutiae are extracted if needed)
+            threshold: Optional threshold for binary match decision
+        
+        Returns:
+            List of MatchResult objects in gallery order
+        """
+        gallery = list(gallery)
+        scores = self.scores(gallery).tolist()
+        return [self._result(score, fp, threshold) for score, fp in zip(scores, gallery)]
+
+
 # Functional API
 
 def extract_minutiae(image: npt.NDArray[np.uint8], 
-                    ppi: int = 500) -> Tuple[List[Minutia], npt.NDArray[np.uint8]]:
+                    ppi: int = 500) -> Tuple[Minutiae, npt.NDArray[np.uint8]]:
     """
     Extract minutiae from a fingerprint image (functional interface).
     
@@ -242,7 +711,7 @@ def extract_minutiae(image: npt.NDArray[np.uint8],
         ppi: Pixels per inch (default: 500)
     
     Returns:
-        Tuple of (minutiae_list, binarized_image)
+        Tuple of (minutiae, binarized_image)
     
     Raises:
         ValueError: If image format is invalid
@@ -319,14 +788,45 @@ def compute_quality(image: npt.NDArray[np.uint8],
     return fp.compute_quality()
 
 
-def match_minutiae(probe_minutiae: List[Minutia], 
-                  gallery_minutiae: List[Minutia]) -> MatchResult:
+def batch_match(probe: Fingerprint,
+                gallery: List[Fingerprint],
+                workers: Optional[int] = None) -> npt.NDArray[np.int32]:
+    """
+    Score a probe against a gallery of fingerprints (1:N, functional interface).
+    
+    All comparisons run in a single extension call that reuses the probe's
+    Bozorth3 edge table. Minutiae are extracted on demand for any
+    fingerprint that has not been processed yet. With ``workers`` the
+    gallery is split into shards scored by separate processes.
+    
+    Args:
+        probe: Probe Fingerprint
+        gallery: Gallery Fingerprints
+        workers: Number of worker processes (default: score in-process)
+    
+    Returns:
+        Array of match scores in gallery order
+    
+    Raises:
+        RuntimeError: If the NBIS extension is not available
+    
+    Example:
+        >>> from pynbis import Fingerprint, batch_match
+        >>> scores = batch_match(probe, gallery)
+        >>> best = int(scores.argmax())
+        >>> print(f"Best match: gallery #{best} (score {scores[best]})")
+    """
+    return probe.matcher_context().scores(gallery, workers=workers)
+
+
+def match_minutiae(probe_minutiae: Union[Minutiae, List[Minutia]], 
+                  gallery_minutiae: Union[Minutiae, List[Minutia]]) -> MatchResult:
     """
     Match two sets of pre-extracted minutiae.
     
     Args:
-        probe_minutiae: List of Minutia objects from probe
-        gallery_minutiae: List of Minutia objects from gallery
+        probe_minutiae: Minutiae (or list of Minutia objects) from probe
+        gallery_minutiae: Minutiae (or list of Minutia objects) from gallery
     
     Returns:
         MatchResult object
@@ -344,10 +844,12 @@ def match_minutiae(probe_minutiae: List[Minutia],
     if _nbis_ext is None:
         raise RuntimeError("NBIS extension not available")
     
-    probe_list = [m.to_dict() for m in probe_minutiae]
-    gallery_list = [m.to_dict() for m in gallery_minutiae]
+    if not isinstance(probe_minutiae, Minutiae):
+        probe_minutiae = Minutiae.from_list(probe_minutiae)
+    if not isinstance(gallery_minutiae, Minutiae):
+        gallery_minutiae = Minutiae.from_list(gallery_minutiae)
     
-    score = _nbis_ext.match_xyt(probe_list, gallery_list)
+    score = _nbis_ext.match_xyt(probe_minutiae.to_xyt(), gallery_minutiae.to_xyt())
     
     return MatchResult(
         score=score,
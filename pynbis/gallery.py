@@ -0,0 +1,279 @@
+"""
+On-disk fingerprint gallery storage for PyNBIS.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import heapq
+import json
+import numpy as np
+import numpy.typing as npt
+
+from .core import Fingerprint
+
+
+class GalleryStore:
+    """
+    Fingerprint gallery backed by memory-mapped files.
+    
+    All gallery images live in one contiguous ``(N, H, W)`` uint8 array on
+    disk, so records are read lazily by the OS instead of being held as N
+    separate allocations. Enrolled minutiae are stored alongside as
+    concatenated ISO/IEC 19794-2 templates with an offset table, so a
+    reopened gallery can be matched without running extraction again.
+    
+    Directory layout:
+        images.npy     (N, H, W) uint8 images
+        templates.bin  concatenated ISO/IEC 19794-2 templates
+        offsets.npy    (N + 1,) int64 template byte offsets
+        gallery.json   metadata (ppi)
+    
+    Attributes:
+        path: Gallery directory
+        images: Memory-mapped ``(N, H, W)`` uint8 image array
+        ppi: Pixels per inch of the gallery images
+    """
+    
+    _IMAGES = "images.npy"
+    _TEMPLATES = "templates.bin"
+    _OFFSETS = "offsets.npy"
+    _META = "gallery.json"
+    
+    def __init__(self, path: Union[str, Path], images: np.memmap, ppi: int):
+        """
+        Initialize a GalleryStore (use create() or open() instead).
+        
+        Args:
+            path: Gallery directory
+            images: Memory-mapped image array
+            ppi: Pixels per inch of the gallery images
+        """
+        self.path = Path(path)
+        self.images = images
+        self.ppi = ppi
+        self._templates: Optional[np.memmap] = None
+        self._offsets: Optional[npt.NDArray[np.int64]] = None
+        self._load_templates()
+    
+    @classmethod
+    def create(cls, path: Union[str, Path],
+               images: Union[npt.NDArray[np.uint8], Sequence[npt.NDArray[np.uint8]]],
+               ppi: int = 500) -> 'GalleryStore':
+        """
+        Write a new gallery to disk.
+        
+        Args:
+            path: Gallery directory (created if needed)
+            images: ``(N, H, W)`` array or sequence of equally sized 2D images
+            ppi: Pixels per inch of the images
+        
+        Returns:
+            GalleryStore opened for reading
+        
+        Raises:
+            ValueError: If the images are empty or not equally sized
+        """
+        if len(images) == 0:
+            raise ValueError("Gallery must contain at least one image")
+        
+        shape = np.shape(images[0])
+        if len(shape) != 2:
+            raise ValueError("Gallery images must be 2D grayscale")
+        
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in (cls._TEMPLATES, cls._OFFSETS):
+            (path / name).unlink(missing_ok=True)
+        
+        out = np.lib.format.open_memmap(path / cls._IMAGES, mode="w+", dtype=np.uint8,
+                                        shape=(len(images),) + shape)
+        for i, image in enumerate(images):
+            if np.shape(image) != shape:
+                raise ValueError("Gallery images must all have the same shape")
+            out[i] = image
+        out.flush()
+        del out
+        
+        (path / cls._META).write_text(json.dumps({"ppi": ppi}))
+        return cls.open(path)
+    
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> 'GalleryStore':
+        """
+        Open an existing gallery.
+        
+        Args:
+            path: Gallery directory
+        
+        Returns:
+            GalleryStore
+        
+        Raises:
+            FileNotFoundError: If the directory is not a gallery
+        """
+        path = Path(path)
+        images = np.load(path / cls._IMAGES, mmap_mode="r")
+        ppi = json.loads((path / cls._META).read_text())["ppi"]
+        return cls(path, images, ppi)
+    
+    @property
+    def enrolled(self) -> bool:
+        """Whether templates are stored for every gallery image."""
+        return self._offsets is not None
+    
+    def enroll(self, workers: Optional[int] = None) -> 'GalleryStore':
+        """
+        Extract minutiae for every image and store them as templates.
+        
+        Extraction releases the GIL, so images are processed by a thread pool.
+        
+        Args:
+            workers: Number of threads (default: ThreadPoolExecutor default)
+        
+        Returns:
+            This GalleryStore
+        """
+        def extract(index: int) -> bytes:
+            # extract_minutiae() runs MINDTCT only; NFIQ is serialized in
+            # the extension and would gain nothing from the thread pool
+            fp = Fingerprint._trusted(self.images[index], self.ppi)
+            fp.extract_minutiae()
+            return fp.to_iso_template()
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            templates = list(executor.map(extract, range(len(self))))
+        
+        offsets = np.zeros(len(templates) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in templates], out=offsets[1:])
+        (self.path / self._TEMPLATES).write_bytes(b"".join(templates))
+        np.save(self.path / self._OFFSETS, offsets)
+        
+        self._load_templates()
+        return self
+    
+    def _load_templates(self) -> None:
+        offsets_path = self.path / self._OFFSETS
+        if not offsets_path.exists():
+            self._templates = None
+            self._offsets = None
+            return
+        self._offsets = np.load(offsets_path)
+        self._templates = np.memmap(self.path / self._TEMPLATES, dtype=np.uint8, mode="r")
+    
+    def template(self, index: int) -> bytes:
+        """
+        Get the stored ISO/IEC 19794-2 template of one gallery record.
+        
+        Raises:
+            RuntimeError: If the gallery has not been enrolled
+            IndexError: If ``index`` is out of range
+        """
+        if self._offsets is None:
+            raise RuntimeError("Gallery has not been enrolled")
+        index = range(len(self))[index]
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._templates[start:end].tobytes()
+    
+    def __len__(self) -> int:
+        return len(self.images)
+    
+    def __getitem__(self, index: int) -> Fingerprint:
+        """
+        Get a gallery record as a Fingerprint.
+        
+        The image is a zero-copy view into the memory map. For an enrolled
+        gallery, minutiae are loaded from the stored template.
+        
+        Raises:
+            TypeError: If ``index`` is not an integer
+            IndexError: If ``index`` is out of range
+        """
+        if not isinstance(index, (int, np.integer)):
+            raise TypeError(f"GalleryStore indices must be integers, not {type(index).__name__}")
+        fp = Fingerprint._trusted(self.images[index], self.ppi)
+        if self._offsets is not None:
+            fp.minutiae = Fingerprint.from_iso_template(self.template(index)).minutiae
+        return fp
+    
+    def __iter__(self) -> Iterator[Fingerprint]:
+        for i in range(len(self)):
+            yield self[i]
+    
+    def __repr__(self) -> str:
+        n, h, w = self.images.shape
+        status = "enrolled" if self.enrolled else "not enrolled"
+        return f"GalleryStore({self.path}, {n}x{h}x{w}, {status})"
+
+
+def iter_gallery(paths: Iterable[Union[str, Path]]) -> Iterator[Fingerprint]:
+    """
+    Lazily load ISO/IEC 19794-2 template files as Fingerprints.
+    
+    Only one template is read at a time, so arbitrarily large galleries can
+    be streamed into iter_scores() or iter_match().
+    
+    Args:
+        paths: Template file paths
+    
+    Yields:
+        Fingerprint objects (minutiae only, no image)
+    """
+    for path in paths:
+        yield Fingerprint.from_iso_template(Path(path).read_bytes())
+
+
+def iter_scores(probe: Fingerprint, gallery: Iterable[Fingerprint],
+                chunk_size: int = 256) -> Iterator[Tuple[int, int]]:
+    """
+    Stream match scores of a probe against a gallery.
+    
+    The gallery is consumed in chunks of ``chunk_size`` fingerprints, each
+    scored with one extension call that reuses the probe's edge table, so
+    at most one chunk of gallery fingerprints is alive at a time.
+    
+    Args:
+        probe: Probe Fingerprint
+        gallery: Iterable of gallery Fingerprints (e.g. a GalleryStore)
+        chunk_size: Number of gallery fingerprints scored per call
+    
+    Yields:
+        (gallery_index, score) tuples in gallery order
+    """
+    context = probe.matcher_context()
+    gallery = iter(gallery)
+    start = 0
+    while True:
+        chunk = list(islice(gallery, chunk_size))
+        if not chunk:
+            return
+        yield from zip(range(start, start + len(chunk)), context.scores(chunk).tolist())
+        start += len(chunk)
+
+
+def iter_match(probe: Fingerprint, gallery: Iterable[Fingerprint],
+               top_k: int = 5, chunk_size: int = 256) -> List[Tuple[int, int]]:
+    """
+    Find the best matches of a probe in a streamed gallery.
+    
+    Peak memory is one chunk of the gallery plus a heap of ``top_k``
+    candidates, independent of the gallery size.
+    
+    Args:
+        probe: Probe Fingerprint
+        gallery: Iterable of gallery Fingerprints (e.g. a GalleryStore)
+        top_k: Number of candidates to return
+        chunk_size: Number of gallery fingerprints scored per call
+    
+    Returns:
+        Up to ``top_k`` (gallery_index, score) tuples, highest score first
+        (earlier gallery entries first on ties)
+    
+    Example:
+        >>> from pynbis import iter_gallery, iter_match
+        >>> top = iter_match(probe, iter_gallery(sorted(Path('db').glob('*.fmr'))))
+        >>> best_index, best_score = top[0]
+    """
+    return heapq.nlargest(top_k, iter_scores(probe, gallery, chunk_size),
+                          key=lambda item: item[1])
@@ -0,0 +1,44 @@
+"""
+Synthetic fixtures for PyNBIS examples, tests and benchmarks.
+"""
+
+from functools import lru_cache
+from typing import Tuple
+import numpy as np
+import numpy.typing as npt
+
+
+# Each entry pins a full image, so keep only the few most recently used
+@lru_cache(maxsize=8)
+def _fixture(seed: int, low: int, high: int,
+             shape: Tuple[int, int]) -> npt.NDArray[np.uint8]:
+    rng = np.random.default_rng(seed)
+    image = rng.integers(low, high, shape, dtype=np.uint8, endpoint=False)
+    image.setflags(write=False)
+    return image
+
+
+def sample_fingerprint(seed: int = 0, low: int = 0, high: int = 256,
+                       shape: Tuple[int, int] = (480, 640)) -> npt.NDArray[np.uint8]:
+    """
+    Get a deterministic synthetic fingerprint-sized image.
+    
+    The most recently used images (up to 8 argument combinations) are
+    cached, so repeated calls are free. The returned array is read-only; call
+    ``.copy()`` before modifying it.
+    
+    Args:
+        seed: Random seed (different seeds give independent images)
+        low: Lowest pixel value (inclusive)
+        high: Highest pixel value (exclusive)
+        shape: Image shape as (height, width)
+    
+    Returns:
+        Read-only uint8 image of uniform noise
+    
+    Example:
+        >>> from pynbis import Fingerprint
+        >>> from pynbis.testing import sample_fingerprint
+        >>> fp = Fingerprint(sample_fingerprint(seed=1))
+    """
+    return _fixture(seed, low, high, tuple(shape))
@@ -3,45 +3,80 @@
 Utility functions for PyNBIS.
 """
 
-from typing import Union, Tuple
+from functools import lru_cache
+from typing import Optional, Union, Tuple
+import importlib
+import mmap
+import os
 import numpy as np
 import numpy.typing as npt
 from pathlib import Path
 
+from .core import (NUM_DIRECTIONS, Minutiae, MinutiaType,
+                   _DIRECTION_DX, _DIRECTION_DY)
+
+
+@lru_cache(maxsize=None)
+def _optional_import(name: str):
+    """
+    Import an optional dependency on first use.
+    
+    The result (the module, or None if it is not installed) is cached, so
+    repeated calls in batch loops skip the import machinery, and importing
+    pynbis does not pay for loading OpenCV/SciPy/Pillow up front.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
 
 def load_fingerprint(filepath: Union[str, Path]) -> npt.NDArray[np.uint8]:
     """
     Load a fingerprint image from file.
     
-    Supports common image formats (PNG, JPEG, BMP, etc.) via PIL/Pillow.
+    Supports common image formats (PNG, JPEG, BMP, etc.). OpenCV is used
+    when installed, since it decodes straight to grayscale; PIL/Pillow is
+    the fallback.
     
     Args:
         filepath: Path to image file
     
     Returns:
-        Grayscale image as uint8 numpy array
+        Grayscale image as uint8 numpy array (may be read-only; copy it
+        before modifying in place)
     
     Raises:
-        ImportError: If PIL/Pillow is not installed
+        ImportError: If neither OpenCV nor PIL/Pillow is installed
         FileNotFoundError: If file doesn't exist
         ValueError: If image format is unsupported
     """
-    try:
-        from PIL import Image
-    except ImportError:
-        raise ImportError("PIL/Pillow is required for image loading. Install with: pip install Pillow")
-    
     filepath = Path(filepath)
     if not filepath.exists():
         raise FileNotFoundError(f"File not found: {filepath}")
     
+    cv2 = _optional_import('cv2')
+    if cv2 is not None:
+        image = cv2.imread(str(filepath), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            return image
+    
+    Image = _optional_import('PIL.Image')
+    if Image is None:
+        raise ImportError("PIL/Pillow or opencv-python is required for image loading. "
+                          "Install with: pip install Pillow")
+    
     img = Image.open(filepath)
     
-    # Convert to grayscale
+    # Convert to grayscale; for JPEGs, draft() lets libjpeg decode straight
+    # to grayscale instead of decoding color and converting afterwards
     if img.mode != 'L':
+        img.draft('L', img.size)
         img = img.convert('L')
     
-    return np.array(img, dtype=np.uint8)
+    # Mode 'L' is 8-bit grayscale, so no dtype conversion (and no second
+    # copy) is needed
+    return np.asarray(img)
 
 
 def save_fingerprint(image: npt.NDArray[np.uint8], 
@@ -55,13 +90,22 @@ def save_fingerprint(image: npt.NDArray[np.uint8],
     
     Raises:
         ImportError: If PIL/Pillow is not installed
+        ValueError: If the image is not 2D (or 3D with a single channel)
     """
-    try:
-        from PIL import Image
-    except ImportError:
+    Image = _optional_import('PIL.Image')
+    if Image is None:
         raise ImportError("PIL/Pillow is required for image saving. Install with: pip install Pillow")
     
-    img = Image.fromarray(image, mode='L')
+    # Accept (H, W, 1) like Fingerprint does
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    elif image.ndim != 2:
+        raise ValueError("Image must be 2D grayscale or 3D with a single channel")
+    
+    # Wrap the pixel buffer directly (no copy for C-contiguous uint8 input)
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape
+    img = Image.frombuffer('L', (width, height), image, 'raw', 'L', 0, 1)
     img.save(filepath)
 
 
@@ -79,23 +123,52 @@ def normalize_image(image: npt.NDArray,
     Returns:
         Normalized image as uint8 array
     """
-    img_float = image.astype(np.float64)
+    if image.dtype == np.uint8:
+        return _normalize_uint8(image, target_mean, target_std)
+    
+    # Work in one float32 buffer, updated in place
+    buf = image.astype(np.float32)
     
-    # Current statistics
-    current_mean = np.mean(img_float)
-    current_std = np.std(img_float)
+    # Current statistics (accumulated in float64)
+    current_mean = buf.mean(dtype=np.float64)
+    current_std = buf.std(dtype=np.float64)
     
     # Avoid division by zero
     if current_std < 1e-6:
         return np.full_like(image, int(target_mean), dtype=np.uint8)
     
     # Normalize
-    normalized = (img_float - current_mean) / current_std
-    normalized = normalized * target_std + target_mean
+    np.subtract(buf, current_mean, out=buf)
+    np.multiply(buf, target_std / current_std, out=buf)
+    np.add(buf, target_mean, out=buf)
     
     # Clip and convert
-    normalized = np.clip(normalized, 0, 255)
-    return normalized.astype(np.uint8)
+    np.clip(buf, 0, 255, out=buf)
+    return buf.astype(np.uint8)
+
+
+def _normalize_uint8(image: npt.NDArray[np.uint8],
+                     target_mean: float,
+                     target_std: float) -> npt.NDArray[np.uint8]:
+    """
+    normalize_image() for uint8 images via a 256-entry lookup table.
+    
+    The statistics come from the image histogram (one pass over the pixels)
+    and the output is a single table gather, so no float image is allocated.
+    """
+    counts = np.bincount(image.ravel(), minlength=256)
+    values = np.arange(256, dtype=np.float64)
+    n = counts.sum()
+    
+    current_mean = counts @ values / n
+    current_std = np.sqrt(counts @ (values - current_mean) ** 2 / n)
+    
+    if current_std < 1e-6:
+        return np.full_like(image, int(target_mean), dtype=np.uint8)
+    
+    lut = (values - current_mean) / current_std * target_std + target_mean
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
+    return np.take(lut, image)
 
 
 def resize_fingerprint(image: npt.NDArray[np.uint8],
@@ -104,6 +177,9 @@ def resize_fingerprint(image: npt.NDArray[np.uint8],
     """
     Resize a fingerprint image to match target PPI.
     
+    Uses OpenCV's bilinear resize on the uint8 image when available and
+    falls back to scipy.ndimage.zoom otherwise.
+    
     Args:
         image: Input fingerprint image
         target_ppi: Target pixels per inch
@@ -113,26 +189,32 @@ def resize_fingerprint(image: npt.NDArray[np.uint8],
         Resized image
     
     Raises:
-        ImportError: If scipy is not installed
+        ImportError: If neither opencv-python nor scipy is installed
     """
     if source_ppi == target_ppi:
         return image
     
-    try:
-        from scipy import ndimage
-    except ImportError:
-        raise ImportError("scipy is required for image resizing. Install with: pip install scipy")
-    
     scale_factor = target_ppi / source_ppi
     new_shape = (int(image.shape[0] * scale_factor), 
                  int(image.shape[1] * scale_factor))
     
+    cv2 = _optional_import('cv2')
+    if cv2 is not None:
+        return cv2.resize(image, (new_shape[1], new_shape[0]),
+                          interpolation=cv2.INTER_LINEAR)
+    
+    ndimage = _optional_import('scipy.ndimage')
+    if ndimage is None:
+        raise ImportError("opencv-python or scipy is required for image resizing. "
+                          "Install with: pip install opencv-python")
+    
     return ndimage.zoom(image, scale_factor, order=1).astype(np.uint8)
 
 
 def visualize_minutiae(image: npt.NDArray[np.uint8],
-                      minutiae: list,
-                      marker_size: int = 10) -> npt.NDArray[np.uint8]:
+                      minutiae: Union[Minutiae, list],
+                      marker_size: int = 10,
+                      out: Optional[npt.NDArray[np.uint8]] = None) -> npt.NDArray[np.uint8]:
     """
     Visualize minutiae on fingerprint image.
     
@@ -140,40 +222,49 @@ def visualize_minutiae(image: npt.NDArray[np.uint8],
     
     Args:
         image: Grayscale fingerprint image
-        minutiae: List of Minutia objects
+        minutiae: Minutiae or list of Minutia objects (NBIS directions)
         marker_size: Size of minutiae markers
+        out: Optional preallocated ``(H, W, 3)`` uint8 array to draw into;
+            reuse it across calls to avoid allocating a color image each time
     
     Returns:
-        Color image with minutiae visualized
+        Color image with minutiae visualized (``out`` if given)
     
     Raises:
         ImportError: If matplotlib or opencv is not available
+        ValueError: If ``out`` has the wrong shape, dtype or layout
     """
-    try:
-        import cv2
-    except ImportError:
+    cv2 = _optional_import('cv2')
+    if cv2 is None:
         raise ImportError("opencv-python is required for visualization. Install with: pip install opencv-python")
     
-    # Convert to color
-    vis_image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-    
-    for minutia in minutiae:
-        x, y = minutia.x, minutia.y
-        
-        # Different colors for different types
-        if minutia.minutia_type.value == 0:  # Ridge ending
-            color = (0, 255, 0)  # Green
-        else:  # Bifurcation
-            color = (0, 0, 255)  # Red
+    if not isinstance(minutiae, Minutiae):
+        minutiae = Minutiae.from_list(minutiae)
+    
+    if out is None:
+        out = np.empty(image.shape + (3,), dtype=np.uint8)
+    elif (out.shape != image.shape + (3,) or out.dtype != np.uint8
+          or not out.flags.c_contiguous):
+        raise ValueError("out must be a C-contiguous (H, W, 3) uint8 array")
+    
+    # Convert to color (gray replicated into all three channels)
+    np.copyto(out, image[..., None])
+    vis_image = out
+    
+    # Direction line end points for all minutiae at once
+    dirs = minutiae.dirs % NUM_DIRECTIONS
+    x_ends = minutiae.xs + (marker_size * 2 * _DIRECTION_DX[dirs]).astype(np.int32)
+    y_ends = minutiae.ys + (marker_size * 2 * _DIRECTION_DY[dirs]).astype(np.int32)
+    endings = minutiae.types == MinutiaType.RIDGE_ENDING.value
+    
+    for x, y, x_end, y_end, ending in zip(minutiae.xs.tolist(), minutiae.ys.tolist(),
+                                          x_ends.tolist(), y_ends.tolist(),
+                                          endings.tolist()):
+        # Ridge endings green, bifurcations red
+        color = (0, 255, 0) if ending else (0, 0, 255)
         
-        # Draw circle
         cv2.circle(vis_image, (x, y), marker_size, color, 2)
-        
-        # Draw direction line
-        direction_rad = minutia.direction * np.pi / 180
-        dx = int(marker_size * 2 * np.cos(direction_rad))
-        dy = int(marker_size * 2 * np.sin(direction_rad))
-        cv2.line(vis_image, (x, y), (x + dx, y + dy), color, 2)
+        cv2.line(vis_image, (x, y), (x_end, y_end), color, 2)
     
     return vis_image
 
@@ -194,39 +285,45 @@ def get_roi(image: npt.NDArray[np.uint8],
     block_size = 16
     h, w = image.shape
     
-    foreground = np.zeros((h // block_size, w // block_size), dtype=bool)
-    
-    for i in range(0, h - block_size, block_size):
-        for j in range(0, w - block_size, block_size):
-            block = image[i:i+block_size, j:j+block_size]
-            var = np.var(block)
-            if var > threshold:
-                foreground[i//block_size, j//block_size] = True
+    # View the full blocks as a (rows, cols, 16, 16) array so the variance
+    # of every block is a single reduction instead of one np.var per block
+    rows, cols = h // block_size, w // block_size
+    blocks = image[:rows * block_size, :cols * block_size].astype(np.float32)
+    blocks = blocks.reshape(rows, block_size, cols, block_size).swapaxes(1, 2)
+    foreground = blocks.var(axis=(2, 3)) > threshold
     
     # Find bounding box
     if not np.any(foreground):
         return 0, 0, w, h
     
-    rows = np.any(foreground, axis=1)
-    cols = np.any(foreground, axis=0)
+    # argmax finds the first True from each end without building index arrays
+    fg_rows = foreground.any(axis=1)
+    fg_cols = foreground.any(axis=0)
     
-    y_min = np.where(rows)[0][0] * block_size
-    y_max = (np.where(rows)[0][-1] + 1) * block_size
-    x_min = np.where(cols)[0][0] * block_size
-    x_max = (np.where(cols)[0][-1] + 1) * block_size
+    y_min = int(fg_rows.argmax()) * block_size
+    y_max = (len(fg_rows) - int(fg_rows[::-1].argmax())) * block_size
+    x_min = int(fg_cols.argmax()) * block_size
+    x_max = (len(fg_cols) - int(fg_cols[::-1].argmax())) * block_size
     
     return x_min, y_min, x_max, y_max
 
 
-def decode_wsq(wsq_data: Union[bytes, str, Path]) -> Tuple[npt.NDArray[np.uint8], int, bool]:
+# WSQ files at least this large are memory-mapped instead of read
+_WSQ_MMAP_THRESHOLD = 1 << 20
+
+
+def decode_wsq(wsq_data: Union[bytes, memoryview, str, Path]) -> Tuple[npt.NDArray[np.uint8], int, bool]:
     """
     Decode a WSQ compressed fingerprint image.
     
     WSQ (Wavelet Scalar Quantization) is the FBI's standard compression format
     for fingerprint images. This function uses NBIS's WSQ decoder.
     
+    Large files are memory-mapped and decoded in place, and bytes-like
+    inputs (bytes, bytearray, memoryview, mmap) are read without copying.
+    
     Args:
-        wsq_data: Either bytes containing WSQ data, or path to WSQ file
+        wsq_data: Either bytes-like WSQ data, or path to WSQ file
     
     Returns:
         Tuple of (image, ppi, lossy_flag):
@@ -251,19 +348,22 @@ def decode_wsq(wsq_data: Union[bytes, str, Path]) -> Tuple[npt.NDArray[np.uint8]
     except ImportError:
         raise RuntimeError("NBIS extension not available. Please build/install pynbis properly.")
     
-    # If path provided, read file
-    if isinstance(wsq_data, (str, Path)):
-        filepath = Path(wsq_data)
-        if not filepath.exists():
-            raise FileNotFoundError(f"File not found: {filepath}")
-        with open(filepath, 'rb') as f:
-            wsq_data = f.read()
-    
-    if not isinstance(wsq_data, bytes):
-        raise TypeError("wsq_data must be bytes or file path")
-    
-    # Decode using NBIS
+    # If path provided, read it with one fstat: small files in a single
+    # read() call, large ones decoded straight from a read-only memory map
+    if isinstance(wsq_data, (str, os.PathLike)):
+        fd = os.open(os.fspath(wsq_data), os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            size = os.fstat(fd).st_size
+            if size < _WSQ_MMAP_THRESHOLD:
+                wsq_data = os.read(fd, size)
+            else:
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                    image, ppi, lossyflag = _nbis_ext.decode_wsq(mm)
+                return image, ppi, bool(lossyflag)
+        finally:
+            os.close(fd)
+    
+    # Decode using NBIS (raises TypeError for non bytes-like input)
     image, ppi, lossyflag = _nbis_ext.decode_wsq(wsq_data)
     
     return image, ppi, bool(lossyflag)
-
@@ -3,31 +3,284 @@
 Download the SOCOFing dataset via kagglehub and link/copy it under ./data/.
 
 Usage:
-  python scripts/download_socofing.py               # symlink to ./data/socofing
-  python scripts/download_socofing.py --copy        # copy files into ./data/socofing (disk heavy)
+  python scripts/download_socofing.py               # hard-link files into ./data/socofing
+  python scripts/download_socofing.py --copy        # copy files into ./data/socofing
+                                                    # (reflinked on CoW filesystems)
+  python scripts/download_socofing.py --shard       # pack files into ./data/socofing.tar
   python scripts/download_socofing.py --force       # overwrite existing link/dir
+  python scripts/download_socofing.py --url URL     # fetch the archive directly (resumable)
   python scripts/download_socofing.py --target ./data/my-socofing
 
 Notes:
   - Requires: python -m pip install --upgrade kagglehub
   - Kaggle authentication may be needed. If prompted, follow kagglehub instructions.
+  - --url downloads the dataset archive from URL into ./data/.downloads with
+    plain HTTP, resuming an interrupted download on the next run, and falls
+    back to kagglehub if the fetch fails. kagglehub is not needed when it
+    succeeds.
+  - The kagglehub download path is remembered in ~/.cache/pynbis/socofing.path
+    (under $XDG_CACHE_HOME if set); later runs reuse it without calling
+    kagglehub while it still holds the images. Delete that file to re-resolve.
+  - --shard writes one uncompressed tar instead of ~6000 small files. Read it
+    sequentially with iter_shard() (or tarfile) instead of opening each image.
 """
 
 from __future__ import annotations
 import argparse
+import errno
 import os
 import shutil
+import sys
+import tarfile
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterator, List, Tuple
 
 DATASET = "ruizgara/socofing"
 
+# Read/write chunk for direct downloads: large enough that the loop is not
+# dominated by per-chunk Python overhead on fast links
+READ_CHUNK = 1 << 20
+
+# ioctl(2) request that clones a whole file on Linux reflink filesystems
+# (btrfs, XFS with reflink=1, bcachefs)
+FICLONE = 0x40049409
+
+# errnos meaning "this filesystem/pair of files can't clone": fall back
+_NO_CLONE = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+             errno.ENOSYS, errno.EPERM}
+
+# errnos meaning "can't hard-link here" (other filesystem, no hard link
+# support, protected_hardlinks, link count limit): fall back
+_NO_LINK = {errno.EXDEV, errno.EOPNOTSUPP, errno.EPERM, errno.EMLINK, errno.ENOSYS}
+
+
+def _clonefile_macos():
+    """Return libc clonefile(2) on macOS (APFS copy-on-write), else None."""
+    if sys.platform != "darwin":
+        return None
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    clonefile = getattr(libc, "clonefile", None)
+    if clonefile is not None:
+        clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    return clonefile
+
+
+def _copy_file(src: str, dst: str, size: int, clonefile=None) -> None:
+    """Copy one file, cloning it (O(1), shared extents) when the FS allows."""
+    if clonefile is not None and clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+        return
+
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError as e:
+                if e.errno not in _NO_CLONE:
+                    raise
+            # copy_file_range copies in the kernel (and reflinks on some
+            # filesystems, e.g. NFS 4.2 / XFS server-side)
+            try:
+                copied = 0
+                while copied < size:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                return
+            except OSError as e:
+                if e.errno not in _NO_CLONE:
+                    raise
+
+    shutil.copyfile(src, dst)
+
+
+def _scan_tree(src: Path, dst: Path) -> List[Tuple[str, str, int]]:
+    """
+    Create the directory skeleton of ``src`` under ``dst`` and list its files.
+
+    Directories are walked with os.scandir (one readdir per directory) and
+    each one is created exactly once.
+
+    Returns:
+        ``(source path, target path, size)`` for every file
+    """
+    files = []
+    stack = [(os.fspath(src), os.fspath(dst))]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        os.makedirs(dst_dir, exist_ok=True)
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                target = os.path.join(dst_dir, entry.name)
+                if entry.is_dir():
+                    stack.append((entry.path, target))
+                else:
+                    files.append((entry.path, target, entry.stat().st_size))
+    return files
+
+
+def _link_tree(src: Path, dst: Path) -> None:
+    """
+    Mirror a directory tree with real directories and hard-linked files.
+
+    Unlike one directory symlink, every tool sees an ordinary tree, and it
+    works on Windows without symlink privileges. Files on another
+    filesystem (where hard links are impossible, and so is cloning) are
+    symlinked instead, and copied only if symlinks are not permitted either.
+    """
+    for s, d, size in _scan_tree(src, dst):
+        try:
+            os.link(s, d)
+            continue
+        except OSError as e:
+            if e.errno not in _NO_LINK:
+                raise
+        try:
+            os.symlink(s, d)
+        except OSError:
+            _copy_file(s, d, size)
+
+
+def _reflink_copytree(src: Path, dst: Path, workers: int | None = None) -> None:
+    """
+    Copy a directory tree, cloning files on copy-on-write filesystems.
+
+    The directory skeleton is created first (see _scan_tree). Files are
+    then copied by a thread pool, which overlaps the per-file
+    open/read/write syscalls of many small images (the GIL is released
+    during file I/O). Each file is
+    cloned with FICLONE (Linux) or clonefile (macOS) when possible, so on
+    btrfs/XFS/APFS the copy is metadata-only; otherwise it falls back to
+    copy_file_range and finally shutil.copyfile.
+    """
+    clonefile = _clonefile_macos()
+    files = _scan_tree(src, dst)
+
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_copy_file, s, d, size, clonefile)
+                   for s, d, size in files]
+        # Surface the first failure promptly instead of after the whole tree
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def _write_shard(src: Path, shard: Path) -> int:
+    """
+    Pack a directory tree into one uncompressed tar, written sequentially.
+
+    Files are added in sorted order with paths relative to ``src``. The tar
+    is streamed ("w|") through a 1 MiB buffer into ``<shard>.part`` and
+    renamed into place once complete.
+
+    Returns:
+        Number of files packed
+    """
+    files = []
+    stack = [os.fspath(src)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                else:
+                    files.append(entry.path)
+    files.sort()
+
+    partial = shard.with_name(shard.name + ".part")
+    with tarfile.open(partial, "w|", bufsize=1 << 20) as tar:
+        for path in files:
+            tar.add(path, arcname=os.path.relpath(path, src), recursive=False)
+    os.replace(partial, shard)
+    return len(files)
 
-def main() -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--copy", action="store_true", help="Copy dataset instead of symlink")
-    parser.add_argument("--force", action="store_true", help="Overwrite existing target")
-    parser.add_argument("--target", type=Path, default=None, help="Custom target dir (default: ./data/socofing)")
-    args = parser.parse_args()
+
+def iter_shard(shard: Path) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream ``(relative path, file bytes)`` pairs from a --shard tar.
+
+    The tar is read front to back in one pass ("r|"), so reading the whole
+    dataset costs sequential I/O on a single file.
+
+    Example:
+        >>> for name, data in iter_shard(Path("data/socofing.tar")):
+        ...     if name.endswith(".BMP"):
+        ...         image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    """
+    with tarfile.open(shard, "r|", bufsize=1 << 20) as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
+
+
+def _download_direct(url: str, dst: Path) -> None:
+    """
+    Download ``url`` to ``dst``, resuming a previous partial download.
+
+    The body is streamed into ``<dst>.part`` in READ_CHUNK pieces. If the
+    part file already exists, only the missing byte range is requested; a
+    server that ignores Range (200 instead of 206) restarts it from zero.
+    ``dst`` only appears once the download is complete.
+    """
+    partial = dst.with_name(dst.name + ".part")
+    start = partial.stat().st_size if partial.exists() else 0
+    request = urllib.request.Request(url, headers={"Range": f"bytes={start}-"} if start else {})
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        # Range not satisfiable: the part file already holds the whole body
+        if e.code != 416 or not start:
+            raise
+        os.replace(partial, dst)
+        return
+
+    with response, open(partial, "ab" if response.status == 206 else "wb") as f:
+        shutil.copyfileobj(response, f, length=READ_CHUNK)
+    os.replace(partial, dst)
+
+
+def _memo_file() -> Path:
+    """File remembering where kagglehub put the dataset."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "pynbis" / "socofing.path"
+
+
+def _has_dataset(path: Path) -> bool:
+    """Whether ``path`` still holds the SOCOFing images (``[SOCOFing/]Real/*.BMP``)."""
+    return any(next(path.glob(pattern), None) is not None
+               for pattern in ("Real/*.BMP", "*/Real/*.BMP"))
+
+
+def _kagglehub_path() -> Path:
+    """
+    Resolve the kagglehub cache directory of the dataset.
+
+    kagglehub.dataset_download() checks the dataset's metadata online on
+    every call, even when it is already cached. The resolved path is
+    remembered in _memo_file() and reused as long as it still holds the
+    images, so repeat runs need neither the network nor kagglehub.
+    """
+    memo = _memo_file()
+    try:
+        cached = Path(memo.read_text(encoding="utf-8").strip())
+        if cached.is_absolute() and _has_dataset(cached):
+            return cached
+    except OSError:
+        pass
 
     try:
         import kagglehub  # type: ignore
@@ -38,16 +291,80 @@ def main() -> None:
         ) from e
 
     print(f"Downloading dataset: {DATASET} ...")
-    cache_path = Path(kagglehub.dataset_download(DATASET)).resolve()
-    print(f"Downloaded to cache: {cache_path}")
+    path = Path(kagglehub.dataset_download(DATASET)).resolve()
+    try:
+        memo.parent.mkdir(parents=True, exist_ok=True)
+        memo.write_text(f"{path}\n", encoding="utf-8")
+    except OSError:
+        pass  # not remembering it only costs a kagglehub call next time
+    return path
+
+
+def _fetch_archive(url: str, downloads: Path) -> Path:
+    """
+    Download and unpack the dataset archive at ``url`` under ``downloads``.
+
+    Both steps are skipped when their output already exists, so re-running
+    after an interruption only does the remaining work. An archive that
+    fails to unpack is deleted so the next run downloads it again.
+
+    Returns:
+        Directory holding the unpacked dataset
+    """
+    downloads.mkdir(parents=True, exist_ok=True)
+    archive = downloads / "socofing.zip"
+    out_dir = downloads / "socofing"
+    if not out_dir.exists():
+        if not archive.exists():
+            print(f"Downloading {url} ...")
+            _download_direct(url, archive)
+        print(f"Unpacking {archive} ...")
+        partial = downloads / "socofing.part"
+        shutil.rmtree(partial, ignore_errors=True)
+        try:
+            shutil.unpack_archive(archive, partial, format="zip")
+        except (shutil.ReadError, zipfile.BadZipFile):
+            # Corrupt or truncated: download it again on the next run
+            shutil.rmtree(partial, ignore_errors=True)
+            archive.unlink()
+            raise
+        os.replace(partial, out_dir)
+    return out_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copy", action="store_true", help="Copy dataset instead of hard-linking")
+    parser.add_argument("--shard", action="store_true",
+                        help="Pack dataset into a single <target>.tar instead of hard-linking")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing target")
+    parser.add_argument("--target", type=Path, default=None,
+                        help="Custom target dir (default: ./data/socofing)")
+    parser.add_argument("--url", default=None,
+                        help="Download the dataset zip from URL (resumable) "
+                             "instead of via kagglehub")
+    args = parser.parse_args()
 
     # Determine repo root (two levels up from this script: scripts/ -> repo)
     repo_root = Path(__file__).resolve().parents[1]
     data_root = repo_root / "data"
     data_root.mkdir(parents=True, exist_ok=True)
 
+    cache_path = None
+    if args.url:
+        try:
+            cache_path = _fetch_archive(args.url, data_root / ".downloads").resolve()
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Direct download failed ({e}); falling back to kagglehub")
+
+    if cache_path is None:
+        cache_path = _kagglehub_path()
+    print(f"Downloaded to cache: {cache_path}")
+
     target_dir = args.target if args.target else (data_root / "socofing")
     target_dir = target_dir.resolve()
+    if args.shard:
+        target_dir = target_dir.with_suffix(".tar")
     print(f"Preparing target: {target_dir}")
 
     if target_dir.exists() or target_dir.is_symlink():
@@ -61,12 +378,16 @@ def main() -> None:
             print("Done.")
             return
 
-    if args.copy:
-        print("Copying dataset into repo (this may take a while)...")
-        shutil.copytree(cache_path, target_dir, dirs_exist_ok=True)
+    if args.shard:
+        print("Packing dataset into a tar shard (one sequential write)...")
+        count = _write_shard(cache_path, target_dir)
+        print(f"Packed {count} files")
+    elif args.copy:
+        print("Copying dataset into repo (instant on reflink filesystems)...")
+        _reflink_copytree(cache_path, target_dir)
     else:
         print("Linking cached dataset into repo (fast, uses minimal disk)...")
-        target_dir.symlink_to(cache_path, target_is_directory=True)
+        _link_tree(cache_path, target_dir)
 
     print("Done.")
     print(f"Dataset available at: {target_dir}")
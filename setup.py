@@ -5,111 +5,112 @@ Setup script for PyNBIS - Python bindings for NBIS fingerprint library.
 
 import os
 import sys
-import glob
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext as _build_ext
+from setuptools.errors import CompileError
 import numpy as np
 
 # Get the directory containing this setup.py
 here = Path(__file__).parent.absolute()
 nbis_src = here / "nbis_src"
+_here_prefix = str(here) + os.sep
+
+def _rel(path):
+    """POSIX-style path of a file under ``here``, relative to ``here``."""
+    s = str(path)
+    if s.startswith(_here_prefix):
+        return s[len(_here_prefix):].replace(os.sep, '/')
+    return Path(os.path.relpath(path, here)).as_posix()
+
+# NBIS library directories to compile, each with the files in it to leave out.
+# Order is preserved in the source list.
+_LIB = nbis_src / "commonnbis" / "src" / "lib"
+_NO_WRITERS = ('to_type9.c', 'update.c', 'results.c')  # ANSI/NIST + mindtct results writers
+_NO_IHEAD_READER = ('readihdr.c',)  # extra dependencies; nistcom.c is needed for WSQ
+NBIS_SOURCE_DIRS = [
+    # Core algorithms
+    (nbis_src / "bozorth3" / "src" / "lib" / "bozorth3", _NO_WRITERS),
+    (nbis_src / "mindtct" / "src" / "lib" / "mindtct", _NO_WRITERS),
+    (nbis_src / "nfiq" / "src" / "lib" / "nfiq", _NO_WRITERS),
+    # WSQ codec, plus the JPEG-L utilities it depends on
+    (nbis_src / "imgtools" / "src" / "lib" / "wsq", ()),
+    (nbis_src / "imgtools" / "src" / "lib" / "jpegl", ()),
+    # Common utilities used by the core algorithms
+    (_LIB / "util", _NO_IHEAD_READER),
+    (_LIB / "ioutil", _NO_IHEAD_READER),    # read_ushort, etc.
+    (_LIB / "mlp", _NO_IHEAD_READER),       # multi-layer perceptron (NFIQ)
+    (_LIB / "ihead", _NO_IHEAD_READER),
+    (_LIB / "image", _NO_IHEAD_READER),
+    (_LIB / "fet", _NO_IHEAD_READER),       # feature files (WSQ)
+    # Math libraries (needed by NFIQ)
+    (_LIB / "cblas", ()),
+    (_LIB / "f2c", ()),
+    # PCASYS MLP runtime (required by NFIQ)
+    (nbis_src / "pcasys" / "src" / "lib" / "mlp", ()),
+]
+
+NBIS_INCLUDE_DIRS = [
+    nbis_src / "bozorth3" / "include",
+    nbis_src / "mindtct" / "include",
+    nbis_src / "nfiq" / "include",
+    nbis_src / "commonnbis" / "include",
+    nbis_src / "an2k" / "include",
+    nbis_src / "pcasys" / "include",
+    nbis_src / "imgtools" / "include",
+    nbis_src / "commonnbis" / "include" / "mlp",
+]
 
-# Collect all NBIS source files we need to compile
 def get_nbis_sources():
-    """Get all required NBIS C source files."""
+    """Get all required NBIS C source files as POSIX paths relative to setup.py."""
     sources = []
-    
-    # Core algorithm directories (these are required)
-    core_dirs = [
-        nbis_src / "bozorth3" / "src" / "lib" / "bozorth3",
-        nbis_src / "mindtct" / "src" / "lib" / "mindtct",
-        nbis_src / "nfiq" / "src" / "lib" / "nfiq",
-    ]
-    
-    # Get all .c files from core directories
-    # Exclude files that are not needed or have complex dependencies
-    excluded_files = ['to_type9.c', 'update.c', 'results.c']  # exclude ANSI/NIST + mindtct results writer
-    
-    for src_dir in core_dirs:
+    for src_dir, excluded in NBIS_SOURCE_DIRS:
         if src_dir.exists():
-            c_files = list(src_dir.glob("*.c"))
-            for f in c_files:
-                if f.name not in excluded_files:
-                    # Use POSIX-style paths relative to setup.py location
-                    rel = Path(os.path.relpath(f, here)).as_posix()
-                    sources.append(rel)
-    
-    # Common library sources (selective - only what we need)
-    # These directories contain utility functions used by the core algorithms
-    common_subdirs = [
-        "util",     # Utility functions
-        "ioutil",   # File I/O helpers (read_ushort, etc.)
-        "mlp",      # Multi-layer perceptron (for NFIQ)
-        "ihead",    # Image header utilities
-        "image",    # Image manipulation
-        "fet",      # Feature file support (used by WSQ)
-    ]
-    
-    # WSQ codec sources (for loading WSQ compressed fingerprints)
-    # Also includes JPEG-L support which WSQ depends on
-    imgtools_subdirs = [
-        "wsq",     # WSQ compression/decompression
-        "jpegl",   # JPEG lossless (utilities used by WSQ)
-    ]
-    
-    for subdir in imgtools_subdirs:
-        src_dir = nbis_src / "imgtools" / "src" / "lib" / subdir
-        if src_dir.exists():
-            for f in src_dir.glob("*.c"):
-                rel = Path(os.path.relpath(f, here)).as_posix()
-                sources.append(rel)
-    
-    for subdir in common_subdirs:
-        src_dir = nbis_src / "commonnbis" / "src" / "lib" / subdir
-        if src_dir.exists():
-            c_files = list(src_dir.glob("*.c"))
-            # Exclude problematic files that have extra dependencies
-            excluded = ['readihdr.c']  # nistcom.c is needed for WSQ
-            for f in c_files:
-                if f.name not in excluded:
-                    rel = Path(os.path.relpath(f, here)).as_posix()
-                    sources.append(rel)
-    
-    # Math libraries (needed by NFIQ)
-    math_dirs = [
-        nbis_src / "commonnbis" / "src" / "lib" / "cblas",
-        nbis_src / "commonnbis" / "src" / "lib" / "f2c",
-    ]
+            # DirEntry.is_file() uses the dirent type, so no stat per file
+            with os.scandir(src_dir) as it:
+                sources.extend(_rel(e.path) for e in it
+                               if e.name.endswith('.c') and e.name not in excluded
+                               and e.is_file(follow_symlinks=False))
+    return sources
+
+def _cached_nbis_sources():
+    """
+    get_nbis_sources(), cached in build/ across setup.py invocations.
     
-    for src_dir in math_dirs:
-        if src_dir.exists():
-            c_files = list(src_dir.glob("*.c"))
-            for f in c_files:
-                rel = Path(os.path.relpath(f, here)).as_posix()
-                sources.append(rel)
-
-    # PCASYS MLP sources (required by NFIQ's MLP runtime)
-    pcasys_mlp_dir = nbis_src / "pcasys" / "src" / "lib" / "mlp"
-    if pcasys_mlp_dir.exists():
-        for f in pcasys_mlp_dir.glob("*.c"):
-            rel = Path(os.path.relpath(f, here)).as_posix()
-            sources.append(rel)
+    A directory's mtime changes whenever a file is added to, removed from
+    or renamed in it, so the cache is keyed on the source directories'
+    mtimes (plus the exclusion lists) rather than on every .c file.
+    """
+    key = repr([(str(d), excluded, os.stat(d).st_mtime_ns if d.exists() else None)
+                for d, excluded in NBIS_SOURCE_DIRS])
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    cache = here / "build" / f".nbis_sources.{digest}.json"
+    try:
+        with open(cache, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
     
+    sources = get_nbis_sources()
+    try:
+        cache.parent.mkdir(exist_ok=True)
+        for stale in cache.parent.glob(".nbis_sources.*.json"):
+            stale.unlink()
+        with open(cache, 'w', encoding='utf-8') as f:
+            json.dump(sources, f)
+    except OSError:
+        pass  # read-only source tree
     return sources
 
 def get_nbis_includes():
     """Get all required NBIS include directories."""
-    includes = [
-        str((nbis_src / "bozorth3" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "mindtct" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "nfiq" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "commonnbis" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "an2k" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "pcasys" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "imgtools" / "include").relative_to(here).as_posix()),
-        str((nbis_src / "commonnbis" / "include" / "mlp").relative_to(here).as_posix()),
-    ]
-    return includes
+    return [_rel(d) for d in NBIS_INCLUDE_DIRS]
 
 # Define compiler flags
 extra_compile_args = []
@@ -123,12 +124,271 @@ elif sys.platform == 'win32':
     extra_compile_args.extend(['/D_CRT_SECURE_NO_WARNINGS'])
 
 # Get NBIS sources and includes
-nbis_sources = get_nbis_sources()
+nbis_sources = _cached_nbis_sources()
 nbis_includes = get_nbis_includes()
 
 print(f"Found {len(nbis_sources)} NBIS source files")
 print(f"Include directories: {nbis_includes}")
 
+class build_ext(_build_ext):
+    """
+    build_ext that compiles NBIS sources in parallel and skips unchanged ones.
+    
+    - Compiles sources on a thread pool of --parallel/-j workers (default:
+      one per CPU). setuptools' own --parallel only builds separate
+      extensions concurrently, which does nothing for our single extension.
+    - Compiles through ccache/sccache when one is on PATH (Unix compilers;
+      set PYNBIS_NO_CCACHE=1 to disable).
+    - Skips sources whose object file is newer than both the source and
+      every header in the include directories, so a rebuild after editing
+      _nbis_ext.c recompiles one file instead of ~160. A stamp file in
+      build_temp records the compiler, flags, macros, include dirs and
+      Python/NumPy versions; when any of them changes, everything is
+      rebuilt.
+    - With PYNBIS_PCH=1 (GCC/Clang), precompiles the C library headers
+      shared by nearly every NBIS source and force-includes them.
+    - With PYNBIS_UNITY=1, compiles each NBIS library directory as one
+      translation unit that #includes its sources (a "unity build").
+    - Builds the NBIS code at -O3. With PYNBIS_NATIVE=1, also targets the
+      build machine's CPU and links with LTO; the result may not run on
+      other machines. Flags the compiler rejects are dropped.
+    - Under ``pip install -e .``, keeps object files in build/ instead of
+      pip's throwaway temp dir, and skips linking when the in-place
+      extension is newer than every source and header.
+    """
+    
+    # System headers included by most NBIS sources. NBIS's own headers are
+    # left out: they are not safe to force-include into every file.
+    PCH_HEADERS = ('stdio.h', 'stdlib.h', 'string.h', 'math.h')
+    
+    # NBIS sources that cannot share a unity file with their neighbours:
+    # mytime.c defines its timers with a different type than mytime.h
+    # declares them, and nistcom.c depends on its own header include order.
+    UNITY_STANDALONE = ('mytime.c', 'nistcom.c')
+    
+    # Optimization flags for the NBIS code. -ffast-math is left out: it
+    # changes NFIQ/mindtct results, and with GCC it can switch the whole
+    # process to flushing denormals to zero when the module is loaded.
+    UNIX_OPT_FLAGS = ('-O3', '-fno-math-errno', '-funroll-loops')
+    UNIX_NATIVE_FLAGS = ('-march=native', '-flto=auto')
+    MSVC_NATIVE_FLAGS = ('/O2', '/GL', '/arch:AVX2')
+    # Link flags needed by an accepted compile flag
+    OPT_LINK_FLAGS = {'-flto=auto': ['-flto=auto'], '/GL': ['/LTCG']}
+    
+    def finalize_options(self):
+        super().finalize_options()
+        if getattr(self, 'editable_mode', False):
+            # setuptools points build_temp at a temporary directory for
+            # editable builds, which would recompile every NBIS source
+            tag = f'{self.plat_name}-{sys.implementation.cache_tag}'
+            self.build_temp = str(here / 'build' / f'temp.{tag}')
+    
+    # Extra compile args for the NBIS sources but not pynbis/_nbis_ext.c
+    _nbis_compile_args = ()
+    
+    def build_extensions(self):
+        # build_extension() skips an extension whose file is newer than its
+        # sources and depends; count the NBIS headers too
+        headers = self._nbis_headers()
+        for ext in self.extensions:
+            ext.depends = ext.depends + headers
+        self._use_optimization_flags()
+        if os.environ.get('PYNBIS_UNITY'):
+            self._use_unity_build()
+        if os.environ.get('PYNBIS_PCH') and self.compiler.compiler_type == 'unix':
+            self._use_precompiled_header()
+        self._use_compiler_cache()
+        self._wrap_compile(headers)
+        super().build_extensions()
+    
+    def build_extension(self, ext):
+        # Objects built with other flags, macros or Python/NumPy headers
+        # must not be reused: rebuild everything when the stamp changes
+        stamp_path = os.path.join(self.build_temp, f'{ext.name}.stamp')
+        stamp = self._build_stamp(ext)
+        try:
+            changed = Path(stamp_path).read_text() != stamp
+        except OSError:
+            changed = True
+        force = self.force
+        self.force = force or changed
+        try:
+            super().build_extension(ext)
+        finally:
+            self.force = force
+        if changed:
+            os.makedirs(self.build_temp, exist_ok=True)
+            Path(stamp_path).write_text(stamp)
+    
+    def _build_stamp(self, ext):
+        compiler = list(self.compiler.compiler_so)
+        if os.path.basename(compiler[0]) in ('ccache', 'sccache'):
+            compiler = compiler[1:]
+        # pip's isolated build env puts NumPy in a new temp dir every time,
+        # so record its version rather than its include path
+        numpy_include = np.get_include()
+        include_dirs = [f'numpy-{np.__version__}' if d == numpy_include else d
+                        for d in ext.include_dirs + self.compiler.include_dirs]
+        return json.dumps({
+            'python': sys.version,
+            'compiler': compiler,
+            'linker': self.compiler.linker_so,
+            'macros': ext.define_macros + ext.undef_macros + self.compiler.macros,
+            'include_dirs': include_dirs,
+            'compile_args': ext.extra_compile_args + list(self._nbis_compile_args),
+            'link_args': ext.extra_link_args,
+        }, indent=1)
+    
+    @staticmethod
+    def _nbis_headers():
+        headers = []
+        for d in nbis_includes:
+            with os.scandir(d) as it:
+                headers.extend(e.path for e in it if e.name.endswith('.h'))
+        return headers
+    
+    def _use_optimization_flags(self):
+        native = os.environ.get('PYNBIS_NATIVE')
+        if self.compiler.compiler_type == 'unix':
+            flags = self.UNIX_OPT_FLAGS + (self.UNIX_NATIVE_FLAGS if native else ())
+        elif self.compiler.compiler_type == 'msvc' and native:
+            flags = self.MSVC_NATIVE_FLAGS
+        else:
+            return
+        
+        compile_args = [flag for flag in flags if self._has_flag(flag)]
+        link_args = [arg for flag in compile_args for arg in self.OPT_LINK_FLAGS.get(flag, ())]
+        for ext in self.extensions:
+            ext.extra_compile_args = ext.extra_compile_args + compile_args
+            ext.extra_link_args = ext.extra_link_args + link_args
+    
+    def _has_flag(self, flag):
+        """Whether the compiler accepts ``flag`` when compiling a trivial file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, 'flagcheck.c')
+            Path(src).write_text('int main(void) { return 0; }\n')
+            try:
+                self.compiler.compile([src], output_dir=tmp, extra_postargs=[flag])
+            except CompileError:
+                return False
+        return True
+    
+    def _use_unity_build(self):
+        unity_dir = os.path.join(self.build_temp, 'unity')
+        os.makedirs(unity_dir, exist_ok=True)
+        
+        for ext in self.extensions:
+            sources = []
+            groups = {}
+            for src in ext.sources:
+                standalone = os.path.basename(src) in self.UNITY_STANDALONE
+                if src.startswith('nbis_src/') and not standalone:
+                    groups.setdefault(os.path.dirname(src), []).append(src)
+                else:
+                    sources.append(src)
+            for src_dir, members in groups.items():
+                unity = os.path.join(unity_dir, src_dir.replace('/', '_') + '.c')
+                self._write_unity_source(unity, members)
+                sources.append(unity)
+            ext.sources = sources
+    
+    @staticmethod
+    def _write_unity_source(path, members):
+        # Macros #defined by a .c file (cblas reuses X, A, SX, ...) are
+        # saved around it with push_macro/pop_macro, so they cannot leak into
+        # the next member and a header macro the file redefines is restored
+        lines = ['/* Generated by setup.py for PYNBIS_UNITY=1 builds. */\n']
+        for src in members:
+            text = Path(src).read_text(errors='replace')
+            names = dict.fromkeys(re.findall(r'^[ \t]*#[ \t]*define[ \t]+(\w+)', text, re.M))
+            lines += [f'#pragma push_macro("{name}")\n' for name in names]
+            lines.append(f'#include "{os.path.abspath(src)}"\n')
+            for name in names:
+                lines += [f'#undef {name}\n', f'#pragma pop_macro("{name}")\n']
+        content = ''.join(lines)
+        
+        # Rewrite when a member changes too, so the object's mtime check
+        # notices the edit
+        try:
+            stale = (os.stat(path).st_mtime < max(os.stat(src).st_mtime for src in members)
+                     or Path(path).read_text() != content)
+        except OSError:
+            stale = True
+        if stale:
+            Path(path).write_text(content)
+    
+    def _use_precompiled_header(self):
+        pch_dir = os.path.join(self.build_temp, 'pch')
+        header = os.path.join(pch_dir, '_nbis_pch.h')
+        content = ''.join(f'#include <{h}>\n' for h in self.PCH_HEADERS)
+        os.makedirs(pch_dir, exist_ok=True)
+        
+        for ext in self.extensions:
+            gch = header + '.gch'
+            stale = not os.path.exists(gch) or self.force
+            if not os.path.exists(header) or Path(header).read_text() != content:
+                Path(header).write_text(content)
+                stale = True
+            if stale:
+                macros = [f'-D{name}={value}' if value is not None else f'-D{name}'
+                          for name, value in ext.define_macros]
+                self.compiler.spawn(self.compiler.compiler_so + macros
+                                    + ext.extra_compile_args
+                                    + ['-x', 'c-header', header, '-o', gch])
+        # NBIS sources only: pynbis/_nbis_ext.c must include Python.h before
+        # any standard header
+        self._nbis_compile_args = ['-Winvalid-pch', '-include', header]
+    
+    def _use_compiler_cache(self):
+        if os.environ.get('PYNBIS_NO_CCACHE') or self.compiler.compiler_type != 'unix':
+            return
+        launcher = shutil.which('ccache') or shutil.which('sccache')
+        compiler_so = self.compiler.compiler_so
+        if launcher and os.path.basename(compiler_so[0]) not in ('ccache', 'sccache'):
+            self.compiler.set_executable('compiler_so', [launcher] + compiler_so)
+    
+    def _wrap_compile(self, headers):
+        workers = self.parallel or os.cpu_count() or 1
+        headers_mtime = max((os.stat(h).st_mtime for h in headers), default=0)
+        compile_sources = self.compiler.compile
+        
+        def is_stale(src, obj):
+            try:
+                obj_mtime = os.stat(obj).st_mtime
+            except OSError:
+                return True
+            return obj_mtime < max(os.stat(src).st_mtime, headers_mtime)
+        
+        def compile_group(group, output_dir, *args, **kwargs):
+            if self._nbis_compile_args and not group[0].startswith('pynbis/'):
+                kwargs['extra_postargs'] = (list(kwargs.get('extra_postargs') or [])
+                                            + self._nbis_compile_args)
+            compile_sources(group, output_dir, *args, **kwargs)
+        
+        def compile_stale(stale, output_dir, *args, **kwargs):
+            if workers == 1 or len(stale) <= 1:
+                glue = [src for src in stale if src.startswith('pynbis/')]
+                for group in (glue, [src for src in stale if src not in glue]):
+                    if group:
+                        compile_group(group, output_dir, *args, **kwargs)
+                return
+            # Each compiler subprocess runs outside the GIL; result() re-raises
+            # the first CompileError once the pool has drained.
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(compile_group, [src], output_dir, *args, **kwargs)
+                           for src in stale]
+            for future in futures:
+                future.result()
+        
+        def compile(sources, output_dir=None, *args, **kwargs):
+            objects = self.compiler.object_filenames(sources, output_dir=output_dir or '')
+            stale = [src for src, obj in zip(sources, objects)
+                     if self.force or is_stale(src, obj)]
+            compile_stale(stale, output_dir, *args, **kwargs)
+            return objects
+        
+        self.compiler.compile = compile
+
 # Define the extension module
 ext_module = Extension(
     'pynbis._nbis_ext',
@@ -146,16 +406,8 @@ ext_module = Extension(
     language='c',
 )
 
-# Read long description from README
-long_description = ""
-readme_path = here / "README.md"
-if readme_path.exists():
-    with open(readme_path, 'r', encoding='utf-8') as f:
-        long_description = f.read()
-
 # Setup configuration
 setup(
     ext_modules=[ext_module],
-    long_description=long_description,
-    long_description_content_type='text/markdown',
+    cmdclass={'build_ext': build_ext},
 )
@@ -0,0 +1,14 @@
+"""
+Shared fixtures for the PyNBIS test suite.
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="session")
+def sample_fp_image():
+    """Random 480x640 uint8 image, generated once per session (read-only)."""
+    image = np.random.default_rng(0).integers(0, 256, (480, 640), dtype=np.uint8)
+    image.flags.writeable = False
+    return image
@@ -3,20 +3,38 @@
 Basic tests for PyNBIS core functionality.
 """
 
-import pytest
 import numpy as np
+import pytest
+
+import pynbis
+from pynbis import (
+    Fingerprint,
+    GalleryStore,
+    MatchResult,
+    Minutia,
+    Minutiae,
+    MinutiaType,
+    QualityResult,
+    batch_match,
+    iter_gallery,
+    iter_match,
+    iter_scores,
+)
+from pynbis.core import _nbis_ext
+from pynbis.matching import direction_difference, pair_features
+from pynbis.testing import sample_fingerprint
+from pynbis.utils import get_roi, load_fingerprint, normalize_image, save_fingerprint
+
+requires_ext = pytest.mark.skipif(_nbis_ext is None, reason="NBIS extension not available")
 
 
 def test_import():
     """Test that the package can be imported."""
-    import pynbis
     assert pynbis.__version__ is not None
 
 
 def test_minutia_class():
     """Test Minutia dataclass."""
-    from pynbis import Minutia, MinutiaType
-    
     m = Minutia(
         x=100,
         y=200,
@@ -30,14 +48,16 @@ def test_minutia_class():
     assert m.direction == 90
     assert m.minutia_type == MinutiaType.RIDGE_ENDING
     assert m.quality == 0.95
+    
+    # Immutable and hashable
+    with pytest.raises(AttributeError):
+        m.x = 0
+    assert len({m, Minutia(100, 200, 90, MinutiaType.RIDGE_ENDING, 0.95)}) == 1
 
 
-def test_fingerprint_class():
+def test_fingerprint_class(sample_fp_image):
     """Test Fingerprint class initialization."""
-    from pynbis import Fingerprint
-    
-    image = np.random.randint(0, 256, (480, 640), dtype=np.uint8)
-    fp = Fingerprint(image, ppi=500)
+    fp = Fingerprint(sample_fp_image, ppi=500)
     
     assert fp.image is not None
     assert fp.ppi == 500
@@ -47,8 +67,6 @@ def test_fingerprint_class():
 
 def test_match_result():
     """Test MatchResult dataclass."""
-    from pynbis import MatchResult
-    
     result = MatchResult(score=75, matched=True)
     assert result.score == 75
     assert result.matched is True
@@ -56,13 +74,217 @@ def test_match_result():
 
 def test_quality_result():
     """Test QualityResult dataclass."""
-    from pynbis import QualityResult
-    
     quality = QualityResult(quality=2, confidence=0.85, return_code=0)
     assert quality.quality == 2
     assert quality.confidence == 0.85
     assert 1 <= quality.quality <= 5
 
 
+def test_iso_template_roundtrip():
+    """Test ISO/IEC 19794-2 template encoding and decoding."""
+    fp = Fingerprint(np.zeros((480, 640), dtype=np.uint8), ppi=500)
+    fp.minutiae = [
+        Minutia(x=10 * d, y=20 + d, direction=d,
+                minutia_type=MinutiaType(d % 2), quality=(50 + d) / 100)
+        for d in range(32)
+    ]
+    
+    template = fp.to_iso_template()
+    assert template[:4] == b"FMR\x00"
+    
+    loaded = Fingerprint.from_iso_template(template)
+    assert loaded.image is None
+    assert loaded.ppi == 500
+    assert loaded.minutiae == fp.minutiae
+    assert repr(loaded) == "Fingerprint(480x640, 32 minutiae)"
+    
+    with pytest.raises(ValueError):
+        Fingerprint.from_iso_template(b"not a template" * 4)
+
+
+@requires_ext
+def test_matcher_context():
+    """Test that batched 1:N matching agrees with single matches."""
+    rng = np.random.default_rng(0)
+    probe = Fingerprint(rng.integers(0, 256, (480, 640), dtype=np.uint8))
+    other = Fingerprint(rng.integers(0, 256, (480, 640), dtype=np.uint8))
+    
+    ctx = probe.matcher_context()
+    results = ctx.match_many([probe, other], threshold=40)
+    
+    assert [r.score for r in results] == [ctx.match(probe).score, ctx.match(other).score]
+    assert results[0].score > results[1].score
+    assert results[0].matched is True
+    assert batch_match(probe, [probe, other]).tolist() == [r.score for r in results]
+    assert batch_match(probe, [probe, other] * 2, workers=2).tolist() == \
+        [r.score for r in results] * 2
+
+
+def test_minutiae_arrays():
+    """Test Minutiae struct-of-arrays container."""
+    items = [
+        Minutia(x=1, y=2, direction=3, minutia_type=MinutiaType.RIDGE_ENDING, quality=0.5),
+        Minutia(x=4, y=5, direction=6, minutia_type=MinutiaType.BIFURCATION, quality=0.95),
+    ]
+    minutiae = Minutiae.from_list(items)
+    
+    assert len(minutiae) == 2
+    assert list(minutiae) == items
+    assert minutiae[1] == items[1]
+    assert minutiae[minutiae.quals > 0.9] == items[1:]
+    assert minutiae.types.tolist() == [0, 1]
+    assert minutiae.to_dicts() == [m.to_dict() for m in items]
+    assert minutiae.to_xyt().tolist() == [[1, 2, 3], [4, 5, 6]]
+    
+    with pytest.raises(ValueError, match="0-31"):
+        Minutiae.from_list([Minutia(1, 2, 300, MinutiaType.RIDGE_ENDING)])
+
+
+def test_sample_fingerprint():
+    """Test the cached synthetic fingerprint fixture."""
+    image = sample_fingerprint()
+    assert image.shape == (480, 640)
+    assert image.dtype == np.uint8
+    assert sample_fingerprint() is image
+    assert not image.flags.writeable
+    assert not np.array_equal(sample_fingerprint(seed=1), image)
+
+
+@requires_ext
+def test_shared_detection_pass():
+    """Test cached detection results and the fused analyze() pass."""
+    image = sample_fingerprint()
+    fp = Fingerprint(image)
+    minutiae = fp.extract_minutiae()
+    assert fp._analysis is None  # extraction alone skips NFIQ
+    quality = fp.compute_quality()
+    
+    assert quality.quality == _nbis_ext.compute_nfiq(image)['quality']
+    assert len(minutiae) == _nbis_ext.extract_minutiae(image)['count']
+    assert fp.extract_minutiae() is minutiae
+    
+    fp.image = sample_fingerprint(seed=1)
+    assert fp.minutiae is None and fp.quality is None
+    assert fp.extract_minutiae() is not minutiae
+    
+    other = Fingerprint(image).analyze()
+    assert other.minutiae == minutiae and other.quality == quality
+
+
+def test_direction_difference():
+    """Test wrapped direction differences on the 32-step NBIS circle."""
+    dirs = np.arange(32, dtype=np.uint8)
+    diff = direction_difference(dirs[:, None], dirs[None, :])
+    expected = np.abs(dirs[:, None].astype(int) - dirs[None, :])
+    expected = np.minimum(expected, 32 - expected)
+    
+    assert diff.dtype == np.uint8
+    np.testing.assert_array_equal(diff, expected)
+
+
+def test_pair_features():
+    """Test pairwise minutia features and their rotation invariance."""
+    # Minutia 0 points north; 1 lies straight ahead, 2 to its right
+    L, alpha, beta = pair_features([0, 0, 10], [0, -5, 0], [0, 8, 8])
+    np.testing.assert_allclose(L, [5, 10, np.hypot(5, 10)], rtol=1e-6)
+    np.testing.assert_allclose(alpha[:2], [0, np.pi / 2], atol=1e-6)
+    np.testing.assert_allclose(beta, [np.pi / 2, np.pi / 2, 0], atol=1e-6)
+    
+    # Rotating the whole set by 90 degrees leaves the features unchanged
+    rng = np.random.default_rng(0)
+    xs, ys, dirs = rng.integers(0, 500, (3, 20))
+    rotated = pair_features(-ys, xs, dirs + 8)
+    for a, b in zip(pair_features(xs, ys, dirs), rotated):
+        np.testing.assert_allclose(a, b, atol=1e-4)
+
+
+def test_gallery_store(tmp_path):
+    """Test memory-mapped gallery storage and template enrollment."""
+    images = [sample_fingerprint(seed=i, shape=(200, 240)) for i in range(3)]
+    store = GalleryStore.create(tmp_path / "gallery", images, ppi=500)
+    
+    assert len(store) == 3
+    assert not store.enrolled
+    np.testing.assert_array_equal(store[1].image, images[1])
+    with pytest.raises(TypeError):
+        store[0:2]
+    
+    if _nbis_ext is None:
+        return
+    
+    store.enroll()
+    assert store.template(-1) == store.template(2)
+    assert Fingerprint.from_iso_template(store.template(-1)).minutiae == store[-1].minutiae
+    with pytest.raises(IndexError):
+        store.template(3)
+    
+    reopened = GalleryStore.open(tmp_path / "gallery")
+    assert reopened.enrolled
+    assert [len(fp.minutiae) for fp in reopened] == \
+        [len(fp.minutiae) for fp in store]
+
+
+@requires_ext
+def test_streaming_match(tmp_path):
+    """Test streamed 1:N scoring and top-k selection."""
+    probe = Fingerprint(sample_fingerprint(seed=0))
+    paths = []
+    for seed in range(4):
+        path = tmp_path / f"{seed}.fmr"
+        path.write_bytes(Fingerprint(sample_fingerprint(seed=seed)).to_iso_template())
+        paths.append(path)
+    
+    gallery = list(iter_gallery(paths))
+    scores = batch_match(probe, gallery)
+    
+    assert [s for _, s in iter_scores(probe, iter_gallery(paths), chunk_size=3)] == scores.tolist()
+    top = iter_match(probe, iter_gallery(paths), top_k=2, chunk_size=3)
+    assert [i for i, _ in top] == np.argsort(-scores, kind='stable')[:2].tolist()
+    assert top[0][0] == 0
+
+
+def test_get_roi():
+    """Test block-variance ROI estimation."""
+    image = np.full((64, 80), 128, dtype=np.uint8)
+    assert get_roi(image) == (0, 0, 80, 64)
+    
+    # Textured region touching the last full block row and column
+    rng = np.random.default_rng(0)
+    image[32:64, 48:80] = rng.integers(0, 256, (32, 32), dtype=np.uint8)
+    assert get_roi(image) == (48, 32, 80, 64)
+    
+    # Fully textured: the box covers every full block (1.0.0 returned
+    # (0, 0, 64, 48) here); trailing partial blocks are still ignored
+    textured = rng.integers(0, 256, (70, 90), dtype=np.uint8)
+    assert get_roi(textured[:64, :80]) == (0, 0, 80, 64)
+    assert get_roi(textured) == (0, 0, 80, 64)
+
+
+def test_normalize_image():
+    """Test the uint8 lookup-table path of normalize_image."""
+    rng = np.random.default_rng(0)
+    image = rng.integers(40, 120, (48, 64), dtype=np.uint8)
+    
+    normalized = normalize_image(image)
+    assert normalized.dtype == np.uint8
+    assert np.array_equal(normalized, normalize_image(image.astype(np.float64)))
+    assert abs(normalized.mean() - 127) < 2
+    
+    flat = normalize_image(np.full((4, 4), 9, dtype=np.uint8))
+    assert np.all(flat == 127)
+
+
+def test_save_load_fingerprint(tmp_path):
+    """Test the PNG round trip, including (H, W, 1) images."""
+    pytest.importorskip("PIL")
+    image = sample_fingerprint(shape=(40, 60))
+    path = tmp_path / "fp.png"
+    
+    save_fingerprint(image[:, :, None], path)
+    np.testing.assert_array_equal(load_fingerprint(path), image)
+    with pytest.raises(ValueError):
+        save_fingerprint(np.zeros((4, 4, 3), dtype=np.uint8), path)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])